@@ -1,33 +1,34 @@
 import os
 import json
 import time
-import pandas as pd
+import random
+import asyncio
+import argparse
+import csv
+import itertools
+import urllib.error
+import urllib.request
+import pyarrow as pa
+import pyarrow.parquet as pq
+from collections import Counter
 from pathlib import Path
-from datasets import Dataset
-from google import genai
-from google.genai import types
+from sample_validator import QuestionIndex, question_hash, validate_item
 
-def setup_client():
-    api_key = input("Please enter your Gemini API key: ")
-    return genai.Client(api_key=api_key)
-
-def format_harmony_wire(instruction, thought, final_output):
-    """Formats into OpenAI Harmony wire format for GPT-OSS 20B."""
-    return (
-        f"<|start|>system<|message|>You are a helpful assistant that reasons step-by-step in Amharic.<|end|>\n"
-        f"<|start|>user<|message|>{instruction}<|end|>\n"
-        f"<|start|>assistant<|channel|>analysis<|message|>{thought}<|end|>\n"
-        f"<|start|>assistant<|channel|>final<|message|>{final_output}<|end|>"
-    )
+MODEL_ID = "gemini-3-pro-preview"
+BATCH_SIZE = 4  # Lower batch size for higher quality per request
+CONCURRENCY = 8           # Upper bound on requests in flight
+REQUESTS_PER_SECOND = 0.5 # Starting rate; adjusted from observed 429s and latency
+TARGET_LATENCY = 120.0    # Seconds; slower answers mean the API is saturated
+REPORT_INTERVAL = 30.0    # Seconds between throughput reports
+OUTPUT_DIR = "Amharic_reasoning_dataset"
+CHECKPOINT_NAME = "checkpoint.jsonl"
+QUESTION_INDEX_NAME = "questions.idx"  # Hashes of every accepted question, across runs
+MIN_YIELD = 0.1  # Floor for the expected share of usable samples per request
 
-def generate_dataset(client, total_count=1000):
-    dataset_rows = []
-    batch_size = 4  # Lower batch size for higher quality per request
-    model_id = "gemini-3-pro-preview" 
-    
-    print(f"🚀 Starting 1000-sample generation with {model_id}...")
+COLUMNS = ["instruction", "thought", "output", "text"]
+SCHEMA = pa.schema([(name, pa.string()) for name in COLUMNS])
 
-    prompt = """
+PROMPT = """
     Generate {batch_size} unique and complex Amharic reasoning tasks.
     Topics: Logic puzzles, Amharic grammar nuances, math word problems, or cultural ethics.
     Return ONLY a JSON list:
@@ -37,60 +38,345 @@ def generate_dataset(client, total_count=1000):
     ]
     """
 
-    while len(dataset_rows) < total_count:
-        try:
-            response = client.models.generate_content(
-                model=model_id,
-                contents=prompt.format(batch_size=batch_size),
-                config=types.GenerateContentConfig(
-                    response_mime_type="application/json",
-                    thinking_config=types.ThinkingConfig(thinking_level="HIGH")
-                )
+class RateLimited(Exception):
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def is_rate_limit(error):
+    return getattr(error, "code", None) == 429 or "429" in str(error) or "RESOURCE_EXHAUSTED" in str(error)
+
+class GeminiClient:
+    """Async wrapper around google-genai; any object with `async generate(prompt) -> str` can replace it."""
+
+    def __init__(self, client, model_id=MODEL_ID):
+        self.client = client
+        self.model_id = model_id
+
+    async def generate(self, prompt):
+        from google.genai import types
+        response = await self.client.aio.models.generate_content(
+            model=self.model_id,
+            contents=prompt,
+            config=types.GenerateContentConfig(
+                response_mime_type="application/json",
+                thinking_config=types.ThinkingConfig(thinking_level="HIGH")
             )
-            
-            batch_data = json.loads(response.text)
-            for item in batch_data:
-                harmony_text = format_harmony_wire(item['q'], item['t'], item['a'])
-                dataset_rows.append({
-                    "instruction": item['q'],
-                    "thought": item['t'],
-                    "output": item['a'],
-                    "text": harmony_text 
-                })
-            
-            print(f"Progress: {len(dataset_rows)}/{total_count}")
-            
-            # Rate limit protection: pause briefly between requests
-            time.sleep(2) 
-
-        except Exception as e:
-            if "429" in str(e):
-                print("⚠️ Rate limit hit. Sleeping for 30 seconds...")
-                time.sleep(30)
-            else:
-                print(f"❌ Error: {e}")
-                time.sleep(5)
+        )
+        return response.text
+
+class HTTPClient:
+    """Client for mock_llm.py's local server, for tests and benchmarks without API costs."""
+
+    def __init__(self, url):
+        self.url = url
+
+    def _post(self, prompt):
+        request = urllib.request.Request(
+            self.url, data=json.dumps({"prompt": prompt}).encode("utf-8"),
+            headers={"Content-Type": "application/json"}
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=600) as response:
+                return json.loads(response.read())["text"]
+        except urllib.error.HTTPError as e:
+            if e.code == 429:
+                retry_after = e.headers.get("Retry-After")
+                raise RateLimited(f"429 from {self.url}", float(retry_after) if retry_after else None) from e
+            raise
+
+    async def generate(self, prompt):
+        return await asyncio.to_thread(self._post, prompt)
+
+def setup_client():
+    from google import genai
+    api_key = os.environ.get("GEMINI_API_KEY") or input("Please enter your Gemini API key: ")
+    return GeminiClient(genai.Client(api_key=api_key))
+
+def backoff_delay(attempt, retry_after=None, base=2.0, cap=120.0):
+    """Exponential backoff with full jitter, never shorter than the server's Retry-After."""
+    delay = random.uniform(0, min(cap, base * 2 ** attempt))
+    return max(delay, retry_after or 0)
+
+class AdaptiveLimiter:
+    """Token bucket plus a concurrency cap, both adjusted AIMD-style.
+
+    A 429 halves the request rate and the number of requests in flight. Answers
+    slower than target_latency shrink the concurrency by one. Otherwise both grow a
+    little each time a full window of requests succeeds.
+    """
+
+    def __init__(self, rate=REQUESTS_PER_SECOND, concurrency=CONCURRENCY, target_latency=TARGET_LATENCY,
+                 min_rate=0.01, max_rate=50.0):
+        self.rate = rate
+        self.max_concurrency = concurrency
+        self.limit = concurrency
+        self.target_latency = target_latency
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.in_flight = 0
+        self.rate_limited = 0
+        self._rate_step = rate / 4
+        self._tokens = 1.0
+        self._updated = time.monotonic()
+        self._successes = 0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+        while True:
+            now = time.monotonic()
+            self._tokens = min(max(1.0, self.rate), self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    async def release(self, latency=None, rate_limited=False):
+        async with self._cond:
+            self.in_flight -= 1
+            if rate_limited:
+                self.rate_limited += 1
+                self.rate = max(self.min_rate, self.rate / 2)
+                self.limit = max(1, self.limit // 2)
+                self._tokens = 0.0
+                self._successes = 0
+            elif latency is not None and latency > self.target_latency:
+                self.limit = max(1, self.limit - 1)
+            elif latency is not None:
+                self._successes += 1
+                if self._successes >= self.limit:
+                    self._successes = 0
+                    self.rate = min(self.max_rate, self.rate + self._rate_step)
+                    self.limit = min(self.max_concurrency, self.limit + 1)
+            self._cond.notify_all()
+
+def format_harmony_wire(instruction, thought, final_output):
+    """Formats into OpenAI Harmony wire format for GPT-OSS 20B."""
+    return (
+        f"<|start|>system<|message|>You are a helpful assistant that reasons step-by-step in Amharic.<|end|>\n"
+        f"<|start|>user<|message|>{instruction}<|end|>\n"
+        f"<|start|>assistant<|channel|>analysis<|message|>{thought}<|end|>\n"
+        f"<|start|>assistant<|channel|>final<|message|>{final_output}<|end|>"
+    )
+
+def parse_batch(text, index, stats, batch_size=BATCH_SIZE):
+    """Returns the valid, previously unseen samples of a response and counts why the rest failed."""
+    try:
+        items = json.loads(text)
+    except ValueError:
+        stats["received"] += batch_size
+        stats["invalid_json"] += batch_size
+        return []
+    if not isinstance(items, list):
+        items = [items]
+    stats["received"] += len(items)
+    rows = []
+    seen = set()
+    for item in items:
+        reason = validate_item(item)
+        if reason is None:
+            q, t, a = (str(item[key]).strip() for key in ("q", "t", "a"))
+            # Same normalized hash as the index, so in-batch repeats are caught the same way
+            key = question_hash(q)
+            if index.seen(q) or key in seen:
+                reason = "duplicate"
+        if reason:
+            stats[reason] += 1
             continue
-            
-    return dataset_rows[:total_count]
+        seen.add(key)
+        harmony_text = format_harmony_wire(q, t, a)
+        rows.append({
+            "instruction": q,
+            "thought": t,
+            "output": a,
+            "text": harmony_text
+        })
+    stats["accepted"] += len(rows)
+    return rows
+
+class Checkpoint:
+    """Append-only JSONL of accepted samples, fsynced after every batch so no paid call is lost."""
+
+    def __init__(self, path):
+        self.path = path
+        self.rows = 0
+        if os.path.exists(path):
+            self._recover()
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def _recover(self):
+        # Counts complete lines and cuts off a half-written last one left by a crash.
+        # A line only counts once its newline is written, or the next append would join it.
+        good = 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    json.loads(line)
+                except ValueError:
+                    break
+                good += len(line)
+                self.rows += 1
+        if good < os.path.getsize(self.path):
+            with open(self.path, 'r+b') as f:
+                f.truncate(good)
 
-def save_ready_for_hf(data_list):
-    folder = "Amharic_reasoning_dataset"
+    def append(self, rows):
+        if not rows:
+            return
+        self._file.write("".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.rows += len(rows)
+
+    def iter_rows(self, limit=None):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for n, line in enumerate(f):
+                if limit is not None and n >= limit:
+                    return
+                yield json.loads(line)
+
+    def close(self):
+        self._file.close()
+
+async def generate_dataset_async(client, checkpoint, index, total_count=1000, batch_size=BATCH_SIZE, limiter=None):
+    limiter = limiter or AdaptiveLimiter()
+    resumed = checkpoint.rows
+    requested = 0  # Requests in flight, so workers stop scheduling once they would cover total_count
+    stats = Counter()
+    start = last_report = time.perf_counter()
+
+    def expected_yield():
+        # Share of returned items that pass validation so far; scales how much each request is worth
+        if stats["received"] < batch_size:
+            return 1.0
+        return max(MIN_YIELD, stats["accepted"] / stats["received"])
+
+    def report(prefix="Progress"):
+        minutes = (time.perf_counter() - start) / 60
+        rate = (checkpoint.rows - resumed) / max(minutes, 1e-9)
+        rejected = ", ".join(f"{k} {v}" for k, v in stats.most_common() if k not in ("received", "accepted"))
+        print(f"{prefix}: {checkpoint.rows}/{total_count} | {rate:.1f} samples/min | "
+              f"rate {limiter.rate:.2f} req/s, concurrency {limiter.limit}, 429s {limiter.rate_limited} | "
+              f"accepted {expected_yield():.0%}" + (f" (rejected: {rejected})" if rejected else ""))
+
+    async def worker():
+        nonlocal requested, last_report
+        attempt = 0
+        while checkpoint.rows + requested * batch_size * expected_yield() < total_count:
+            requested += 1
+            await limiter.acquire()
+            sent = time.perf_counter()
+            try:
+                text = await client.generate(PROMPT.format(batch_size=batch_size))
+            except Exception as e:
+                requested -= 1
+                rate_limited = is_rate_limit(e)
+                await limiter.release(rate_limited=rate_limited)
+                attempt += 1
+                if not rate_limited:
+                    print(f"❌ Error: {e}")
+                await asyncio.sleep(backoff_delay(attempt, getattr(e, "retry_after", None)))
+                continue
+            requested -= 1
+            await limiter.release(time.perf_counter() - sent)
+            attempt = 0
+
+            rows = parse_batch(text, index, stats, batch_size)
+            checkpoint.append(rows)
+            index.add(row["instruction"] for row in rows)
+            if time.perf_counter() - last_report >= REPORT_INTERVAL:
+                last_report = time.perf_counter()
+                report()
+
+    if resumed:
+        print(f"↩️ Resuming from {resumed} checkpointed samples")
+    print(f"🚀 Starting {total_count}-sample generation (up to {limiter.max_concurrency} requests in flight)...")
+    await asyncio.gather(*(worker() for _ in range(limiter.max_concurrency)))
+    report("Done")
+    return min(checkpoint.rows, total_count)
+
+def generate_dataset(client, checkpoint, index, total_count=1000, concurrency=CONCURRENCY, rate=REQUESTS_PER_SECOND):
+    limiter = AdaptiveLimiter(rate=rate, concurrency=concurrency)
+    return asyncio.run(generate_dataset_async(client, checkpoint, index, total_count, limiter=limiter))
+
+def save_ready_for_hf(checkpoint, total_count, folder=OUTPUT_DIR, chunk_rows=1000):
+    """Streams the first total_count checkpointed samples into Parquet, JSONL and CSV."""
     Path(folder).mkdir(parents=True, exist_ok=True)
-    
-    # 1. Parquet (Ready for Hugging Face)
-    hf_ds = Dataset.from_list(data_list)
-    hf_ds.to_parquet(os.path.join(folder, "dataset.parquet"))
-    
-    # 2. JSONL & CSV
-    hf_ds.to_json(os.path.join(folder, "dataset.jsonl"), force_ascii=False)
-    pd.DataFrame(data_list).to_csv(os.path.join(folder, "dataset.csv"), index=False, encoding='utf-8-sig')
-    
-    print(f"\n✅ COMPLETE! 1000 samples saved in: {os.path.abspath(folder)}")
+    parquet_path = os.path.join(folder, "dataset.parquet")
+    jsonl_path = os.path.join(folder, "dataset.jsonl")
+    csv_path = os.path.join(folder, "dataset.csv")
+
+    parquet = None
+    written = 0
+    with open(jsonl_path + '.tmp', 'w', encoding='utf-8') as jsonl_file, \
+            open(csv_path + '.tmp', 'w', encoding='utf-8-sig', newline='') as csv_file:
+        csv_writer = csv.DictWriter(csv_file, fieldnames=COLUMNS)
+        csv_writer.writeheader()
+        rows = checkpoint.iter_rows(total_count)
+        while True:
+            chunk = list(itertools.islice(rows, chunk_rows))
+            if not chunk:
+                break
+            # 1. Parquet (Ready for Hugging Face)
+            table = pa.Table.from_pylist(chunk, schema=SCHEMA)
+            if parquet is None:
+                parquet = pq.ParquetWriter(parquet_path + '.tmp', SCHEMA)
+            parquet.write_table(table)
+            # 2. JSONL & CSV
+            for row in chunk:
+                jsonl_file.write(json.dumps(row, ensure_ascii=False) + "\n")
+                csv_writer.writerow(row)
+            written += len(chunk)
+    if parquet is None:
+        parquet = pq.ParquetWriter(parquet_path + '.tmp', SCHEMA)
+    parquet.close()
+    for path in (parquet_path, jsonl_path, csv_path):
+        os.replace(path + '.tmp', path)
+
+    print(f"\n✅ COMPLETE! {written} samples saved in: {os.path.abspath(folder)}")
 
 if __name__ == "__main__":
-    client = setup_client()
-    # Now set to 1000 for the full dataset
-    final_data = generate_dataset(client, total_count=1000)
-    if final_data:
-        save_ready_for_hf(final_data)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Generate an Amharic reasoning dataset in Harmony format.")
+    parser.add_argument("--count", type=int, default=1000, help="Samples to generate")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY, help="Maximum requests in flight")
+    parser.add_argument("--rate", type=float, default=REQUESTS_PER_SECOND, help="Starting requests per second")
+    parser.add_argument("--resume", action="store_true", help="Continue from the checkpoint of an earlier run")
+    parser.add_argument("--mock", action="store_true", help="Use the in-process mock LLM (no API key, no cost)")
+    parser.add_argument("--mock-url", help="Use a mock_llm.py server, e.g. http://127.0.0.1:8808/generate")
+    args = parser.parse_args()
+
+    Path(OUTPUT_DIR).mkdir(parents=True, exist_ok=True)
+    checkpoint_path = os.path.join(OUTPUT_DIR, CHECKPOINT_NAME)
+    if not args.resume and os.path.exists(checkpoint_path) and os.path.getsize(checkpoint_path):
+        # Never throw away paid samples: keep the old checkpoint next to the new one
+        kept = checkpoint_path.replace(".jsonl", time.strftime(".%Y%m%d-%H%M%S.jsonl"))
+        os.replace(checkpoint_path, kept)
+        print(f"Previous checkpoint moved to {kept} (use --resume to continue it instead)")
+    checkpoint = Checkpoint(checkpoint_path)
+    index = QuestionIndex(os.path.join(OUTPUT_DIR, QUESTION_INDEX_NAME))
+    # Questions checkpointed before the index was written (e.g. a crash in between)
+    index.add(row["instruction"] for row in checkpoint.iter_rows())
+
+    if args.mock:
+        from mock_llm import MockLLMClient
+        client = MockLLMClient()
+    elif args.mock_url:
+        client = HTTPClient(args.mock_url)
+    else:
+        client = setup_client()
+    try:
+        generate_dataset(client, checkpoint, index, total_count=args.count, concurrency=args.concurrency, rate=args.rate)
+    except KeyboardInterrupt:
+        print(f"\n⏸️ Stopped with {checkpoint.rows} samples checkpointed in {checkpoint_path}; rerun with --resume")
+        raise SystemExit(1)
+    finally:
+        checkpoint.close()
+        index.close()
+    if checkpoint.rows:
+        save_ready_for_hf(checkpoint, args.count)
@@ -0,0 +1,119 @@
+import re
+import json
+import time
+import random
+import threading
+import asyncio
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Question/thought/answer templates; the numbers make every generated item unique
+TEMPLATES = [
+    ("አበበ {a} ፖም ነበረው። {b}ቱን ለወንድሙ ሰጠ። አሁን ስንት ፖም አለው?",
+     "በመጀመሪያ {a} ፖም ነበረው። {b}ቱን ሲሰጥ ({a} - {b} = {c}) ይቀረዋል።", "{c}"),
+    ("አንድ መኪና በሰዓት {a} ኪሎ ሜትር ይጓዛል። በ{b} ሰዓት ስንት ኪሎ ሜትር ይጓዛል?",
+     "በሰዓት {a} ኪሎ ሜትር ከሆነ፣ በ{b} ሰዓት {a} × {b} = {d} ኪሎ ሜትር ይጓዛል።", "{d} ኪሎ ሜትር"),
+    ("ሳራ {a} ብር አላት። {b} ብር ተጨማሪ ብታገኝ ስንት ብር ይኖራታል?",
+     "ሳራ {a} ብር አላት። {b} ብር ሲጨመር {a} + {b} = {e} ብር ይሆናል።", "{e} ብር"),
+]
+BATCH_SIZE = re.compile(r"Generate (\d+)")
+
+def fake_batch(prompt, rng):
+    match = BATCH_SIZE.search(prompt)
+    items = []
+    for _ in range(int(match.group(1)) if match else 4):
+        q, t, a = rng.choice(TEMPLATES)
+        b = rng.randint(1, 500)
+        values = {"a": b + rng.randint(1, 5000), "b": b}
+        values.update(c=values["a"] - b, d=values["a"] * b, e=values["a"] + b)
+        items.append({"q": q.format(**values), "t": t.format(**values), "a": a.format(**values)})
+    return json.dumps(items, ensure_ascii=False)
+
+class MockLimiter:
+    """Server-side quota: at most rps requests per second, like the real API's per-minute limit."""
+
+    def __init__(self, rps):
+        self.rps = rps
+        self.tokens = rps
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def allow(self):
+        if not self.rps:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.rps, self.tokens + (now - self.updated) * self.rps)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+class MockRateLimitError(Exception):
+    code = 429
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class MockLLMClient:
+    """In-process stand-in for the Gemini client with latency, a quota and random failures."""
+
+    def __init__(self, latency=0.5, rps=None, error_rate=0.0, seed=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.limiter = MockLimiter(rps)
+        self.rng = random.Random(seed)
+        self.requests = 0
+
+    async def generate(self, prompt):
+        self.requests += 1
+        if not self.limiter.allow():
+            raise MockRateLimitError("429 RESOURCE_EXHAUSTED (mock)", retry_after=1.0)
+        await asyncio.sleep(self.latency * self.rng.uniform(0.5, 1.5))
+        if self.rng.random() < self.error_rate:
+            raise RuntimeError("500 INTERNAL (mock)")
+        return fake_batch(prompt, self.rng)
+
+def serve(port=8808, latency=0.5, rps=None, error_rate=0.0, seed=0):
+    """Local HTTP mock: POST {"prompt": ...} to /generate, answered with {"text": ...} or 429."""
+    limiter = MockLimiter(rps)
+    rng = random.Random(seed)
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            prompt = json.loads(self.rfile.read(length) or b"{}").get("prompt", "")
+            if not limiter.allow():
+                return self._reply(429, {"error": "RESOURCE_EXHAUSTED"}, {"Retry-After": "1"})
+            time.sleep(latency * rng.uniform(0.5, 1.5))
+            if rng.random() < error_rate:
+                return self._reply(500, {"error": "INTERNAL"})
+            self._reply(200, {"text": fake_batch(prompt, rng)})
+
+        def _reply(self, status, body, headers=None):
+            data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    print(f"Mock LLM listening on http://127.0.0.1:{port}/generate")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local mock of the generation API for tests and benchmarks.")
+    parser.add_argument("--port", type=int, default=8808)
+    parser.add_argument("--latency", type=float, default=0.5, help="Mean seconds per request")
+    parser.add_argument("--rps", type=float, default=None, help="Requests per second before answering 429")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    serve(args.port, args.latency, args.rps, args.error_rate)
@@ -0,0 +1,76 @@
+import os
+import re
+import hashlib
+import unicodedata
+
+# Characters per field, and the share of letters that must be Ge'ez script
+LENGTH_BOUNDS = {"q": (10, 2000), "t": (20, 8000), "a": (1, 2000)}
+MIN_GEEZ_RATIO = {"q": 0.7, "t": 0.7, "a": 0.5}
+_NOT_WORD = re.compile(r"[\W_]+")
+
+def geez_ratio(text):
+    """Share of letters in the Ethiopic blocks; None when the text has no letters (e.g. "6")."""
+    letters = [c for c in text if c.isalpha()]
+    if not letters:
+        return None
+    geez = sum(1 for c in letters if 'ሀ' <= c <= '᎟' or 'ⶀ' <= c <= '⷟' or '꬀' <= c <= '꬯')
+    return geez / len(letters)
+
+def validate_item(item):
+    """Returns None for a usable q/t/a item, otherwise the reason it is rejected."""
+    if not isinstance(item, dict):
+        return "not_an_object"
+    for key, (low, high) in LENGTH_BOUNDS.items():
+        value = item.get(key)
+        if not isinstance(value, (str, int, float)) or isinstance(value, bool) or not str(value).strip():
+            return "missing_" + key
+        if not low <= len(str(value).strip()) <= high:
+            return "length_" + key
+        ratio = geez_ratio(str(value))
+        if ratio is not None and ratio < MIN_GEEZ_RATIO[key]:
+            return "not_amharic_" + key
+    return None
+
+def normalize_question(text):
+    return _NOT_WORD.sub("", unicodedata.normalize("NFC", text).lower())
+
+def question_hash(question):
+    """8-byte key of a question; questions differing only in case, spacing or punctuation share it."""
+    return hashlib.blake2b(normalize_question(question).encode('utf-8'), digest_size=8).digest()
+
+class QuestionIndex:
+    """Hashes of normalized questions already accepted, kept in a file across runs.
+
+    Each accepted question appends its 8-byte hash to the file, so the index
+    survives crashes and spans every run writing to the same folder.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._hashes = set()
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                data = f.read()
+            usable = len(data) - len(data) % 8
+            self._hashes = {data[i:i + 8] for i in range(0, usable, 8)}
+            if usable < len(data):
+                with open(path, 'r+b') as f:
+                    f.truncate(usable)  # Partial hash from an interrupted write
+        self._file = open(path, 'ab')
+
+    def __len__(self):
+        return len(self._hashes)
+
+    def seen(self, question):
+        return question_hash(question) in self._hashes
+
+    def add(self, questions):
+        new = [h for h in map(question_hash, questions) if h not in self._hashes]
+        if new:
+            self._hashes.update(new)
+            self._file.write(b"".join(new))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
@@ -0,0 +1,89 @@
+import re
+
+# Paragraphs are separated by blank lines; sentences end at the Amharic full stop
+PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+SENTENCE = re.compile(r"[^።]*።+\s*|[^።]+$")
+
+class TokenChunker:
+    """Packs whole sentences into chunks of at most max_tokens tokens of the target tokenizer.
+
+    Text is split at paragraph breaks and at `።`, every piece of a document is
+    measured with one batched call to the fast tokenizer, and pieces are packed
+    greedily. The last overlap_tokens worth of sentences are repeated at the start
+    of the next chunk. A single sentence longer than the budget is cut at token
+    boundaries.
+    """
+
+    def __init__(self, tokenizer, max_tokens=1024, overlap_tokens=0):
+        if overlap_tokens >= max_tokens:
+            raise ValueError("overlap_tokens must be smaller than max_tokens")
+        self.tokenizer = tokenizer
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+
+    @classmethod
+    def from_pretrained(cls, name, max_tokens=1024, overlap_tokens=0):
+        from transformers import AutoTokenizer
+        return cls(AutoTokenizer.from_pretrained(name, use_fast=True), max_tokens, overlap_tokens)
+
+    def split(self, text):
+        """Sentence pieces in order; the last piece of each paragraph ends with a blank line."""
+        pieces = []
+        for paragraph in PARAGRAPH_BREAK.split(text):
+            sentences = [s for s in SENTENCE.findall(paragraph.strip()) if s.strip()]
+            if sentences:
+                sentences[-1] = sentences[-1].rstrip() + "\n\n"
+                pieces.extend(sentences)
+        return pieces
+
+    def _count(self, texts):
+        if not texts:
+            return []
+        return [len(ids) for ids in self.tokenizer(texts, add_special_tokens=False)["input_ids"]]
+
+    def _cut(self, piece):
+        """Splits an over-long sentence into pieces of max_tokens tokens."""
+        offsets = self.tokenizer(piece, add_special_tokens=False, return_offsets_mapping=True)["offset_mapping"]
+        bounds = [0]
+        i = self.max_tokens
+        while i < len(offsets):
+            # Byte-level tokens of one character share its offsets; never cut between them
+            cut = i
+            while cut > i - self.max_tokens + 1 and offsets[cut][0] == offsets[cut - 1][0]:
+                cut -= 1
+            bounds.append(offsets[cut][0])
+            i = cut + self.max_tokens
+        bounds.append(len(piece))
+        return [piece[a:b] for a, b in zip(bounds, bounds[1:]) if piece[a:b].strip()]
+
+    def chunk(self, text):
+        """Returns [(chunk_text, num_tokens), ...] for one document."""
+        split = self.split(text)
+        pieces = []
+        for piece, n in zip(split, self._count(split)):
+            if n > self.max_tokens:
+                cut = self._cut(piece)
+                pieces.extend(zip(cut, self._count(cut)))
+            else:
+                pieces.append((piece, n))
+
+        chunks = []
+        current, size = [], 0
+        for piece, n in pieces:
+            if current and size + n > self.max_tokens:
+                chunks.append("".join(p for p, _ in current).strip())
+                # Carry trailing sentences into the next chunk as overlap
+                carried, carried_size = [], 0
+                for p, m in reversed(current):
+                    if carried_size + m > self.overlap_tokens or carried_size + m + n > self.max_tokens:
+                        break
+                    carried.insert(0, (p, m))
+                    carried_size += m
+                current, size = carried, carried_size
+            current.append((piece, n))
+            size += n
+        if current:
+            chunks.append("".join(p for p, _ in current).strip())
+
+        chunks = [c for c in chunks if c]
+        return list(zip(chunks, self._count(chunks)))
@@ -1,9 +1,60 @@
 import os
+import csv
 import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from docx import Document
 from PyPDF2 import PdfReader
-from datasets import Dataset
+from harmony_chunker import TokenChunker
+from harmony_dedup import DuplicateIndex, MinHasher
+from harmony_manifest import Manifest
+
+SUPPORTED_EXTENSIONS = {'.json', '.csv', '.txt', '.docx', '.pdf', '.jsonl'}
+OUTPUT_PREFIX = "amharic_harmony"
+TOKENIZER = "openai/gpt-oss-20b"  # Chunks are measured with the fine-tuning target's tokenizer
+MAX_TOKENS = 1024
+OVERLAP_TOKENS = 0
+ROW_GROUP_SIZE = 1000     # Rows buffered per Parquet row group
+PROGRESS_INTERVAL = 5.0   # Seconds between progress reports
+DEDUP_MODE = "drop"       # "drop" or "flag" near-duplicate chunks, or "off"
+
+DEVELOPER_PROMPT = "You are a helpful Amharic AI assistant. Reasoning: medium"
+USER_PROMPT = "ተጨማሪ የአማርኛ ጽሑፎችን አቅርብልኝ"
+
+COLUMNS = ["reasoning_language", "developer", "user", "analysis", "final", "messages", "num_tokens", "duplicate_of"]
+PARQUET_SCHEMA = pa.schema([
+    ("reasoning_language", pa.string()),
+    ("developer", pa.string()),
+    ("user", pa.string()),
+    ("analysis", pa.string()),
+    ("final", pa.string()),
+    ("messages", pa.list_(pa.struct([
+        ("role", pa.string()),
+        ("content", pa.string()),
+        ("thinking", pa.string()),
+    ]))),
+    ("num_tokens", pa.int32()),
+    ("duplicate_of", pa.string()),
+])
+
+# Set in each worker process by init_worker()
+_chunker = None
+_hasher = None
+
+def _json_strings(value):
+    """Yields every string inside a parsed JSON value, in document order."""
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _json_strings(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _json_strings(item)
 
 def extract_text(file_path):
     """Basic extraction from various formats."""
@@ -24,44 +75,243 @@ def extract_text(file_path):
             doc = Document(file_path)
             for para in doc.paragraphs:
                 text_content.append(para.text)
-    except Exception: pass
+        elif ext == '.json':
+            with open(file_path, 'r', encoding='utf-8') as f:
+                text_content.extend(_json_strings(json.load(f)))
+        elif ext == '.jsonl':
+            with open(file_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        text_content.extend(_json_strings(json.loads(line)))
+    except Exception as e:
+        print(f"Extraction Error ({file_path}): {e}")
     return "\n".join(filter(None, text_content))
 
-def run_conversion():
-    supported_extensions = {'.json', '.csv', '.txt', '.docx', '.pdf', '.jsonl'}
-    rows = []
-
-    files = [f for f in os.listdir('.') if os.path.splitext(f)[1].lower() in supported_extensions]
-    
-    for file_name in files:
-        raw_text = extract_text(file_name)
-        if not raw_text.strip(): continue
-
-        # Break into chunks
-        chunks = [raw_text[i:i+2000] for i in range(0, len(raw_text), 2000)]
-        
-        for chunk in chunks:
-            # We create the structure found in Multilingual-Thinking
-            rows.append({
-                "reasoning_language": "Amharic",
-                "developer": "You are a helpful Amharic AI assistant. Reasoning: medium",
-                "user": "ተጨማሪ የአማርኛ ጽሑፎችን አቅርብልኝ (Provide me more Amharic text)", # Simulated user request
-                "analysis": "", # Leave empty as you have no reasoning traces
-                "final": chunk, # Your actual Amharic corpus text
-                "messages": [
-                    {"role": "system", "content": "You are a helpful Amharic AI assistant. Reasoning: medium"},
-                    {"role": "user", "content": "ተጨማሪ የአማርኛ ጽሑፎችን አቅርብልኝ"},
-                    {"role": "assistant", "content": chunk, "thinking": ""}
-                ]
-            })
-
-    dataset = Dataset.from_list(rows)
-    
-    # Save in your requested formats
-    dataset.to_csv("amharic_harmony.csv", index=False)
-    dataset.to_json("amharic_harmony.jsonl", orient="records", lines=True, force_ascii=False)
-    dataset.to_parquet("amharic_harmony.parquet")
-    print(f"Success! Created {len(rows)} rows with reasoning/developer columns.")
+def make_row(chunk, num_tokens):
+    # We create the structure found in Multilingual-Thinking
+    return {
+        "reasoning_language": "Amharic",
+        "developer": DEVELOPER_PROMPT,
+        "user": USER_PROMPT + " (Provide me more Amharic text)", # Simulated user request
+        "analysis": "", # Leave empty as you have no reasoning traces
+        "final": chunk, # Your actual Amharic corpus text
+        "messages": [
+            {"role": "system", "content": DEVELOPER_PROMPT},
+            {"role": "user", "content": USER_PROMPT},
+            {"role": "assistant", "content": chunk, "thinking": ""}
+        ],
+        "num_tokens": num_tokens,
+        "duplicate_of": "" # Source file of the earlier near-duplicate, in --dedup flag mode
+    }
+
+def init_worker(tokenizer_name, max_tokens, overlap_tokens, dedup):
+    # Each worker loads the tokenizer once and reuses it for every file
+    global _chunker, _hasher
+    _chunker = TokenChunker.from_pretrained(tokenizer_name, max_tokens, overlap_tokens)
+    _hasher = MinHasher() if dedup else None
+
+def convert_file(file_path):
+    """Runs in a worker process: extracts one file and returns its rows."""
+    raw_text = extract_text(file_path)
+    if not raw_text.strip():
+        return []
+    # Break into sentence-aligned chunks that fit the token budget
+    rows = [make_row(chunk, num_tokens) for chunk, num_tokens in _chunker.chunk(raw_text)]
+    if _hasher:
+        # MinHash keys are computed here; only the index lookup runs in the main process
+        for row in rows:
+            row["_bands"] = _hasher.band_keys(row["final"])
+    return rows
+
+def output_paths(output_prefix):
+    """Everything the converter writes, so it is never read back in as input."""
+    return {
+        "csv": output_prefix + ".csv",
+        "jsonl": output_prefix + ".jsonl",
+        "parquet": output_prefix + ".parquet",
+        "manifest": output_prefix + ".manifest.json",
+        "shards": output_prefix + "_shards",
+    }
+
+def find_input_files(root, output_prefix, recursive=True):
+    """Supported files under root, sorted, without the converter's own outputs."""
+    outputs = {os.path.abspath(p) for p in output_paths(output_prefix).values()}
+    files = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(
+            d for d in dirnames
+            if not d.startswith('.') and d != '__pycache__' and os.path.abspath(os.path.join(dirpath, d)) not in outputs
+        ) if recursive else []
+        for name in sorted(filenames):
+            path = os.path.join(dirpath, name)
+            if os.path.splitext(name)[1].lower() in SUPPORTED_EXTENSIONS and os.path.abspath(path) not in outputs:
+                files.append(path)
+    return files
+
+def map_in_order(executor, fn, items, window):
+    """Like executor.map, but keeps at most `window` results in flight so memory stays flat."""
+    items = iter(items)
+    futures = []
+    for item in items:
+        futures.append((item, executor.submit(fn, item)))
+        if len(futures) >= window:
+            break
+    while futures:
+        item, future = futures.pop(0)
+        yield item, future.result()
+        for item in items:
+            futures.append((item, executor.submit(fn, item)))
+            break
+
+class HarmonyWriter:
+    """Streams rows to CSV, JSONL and Parquet; files appear under their final names on close()."""
+
+    def __init__(self, output_prefix, row_group_size=ROW_GROUP_SIZE):
+        self.paths = {ext: output_prefix + ext for ext in ('.csv', '.jsonl', '.parquet')}
+        self.row_group_size = row_group_size
+        self.rows = 0
+        self._buffer = []  # Tables waiting to fill a Parquet row group
+        self._buffered = 0
+        self._jsonl = open(self.paths['.jsonl'] + '.tmp', 'w', encoding='utf-8')
+        self._csv_file = open(self.paths['.csv'] + '.tmp', 'w', encoding='utf-8', newline='')
+        self._csv = csv.DictWriter(self._csv_file, fieldnames=COLUMNS)
+        self._csv.writeheader()
+        self._parquet = pq.ParquetWriter(self.paths['.parquet'] + '.tmp', PARQUET_SCHEMA)
+
+    def write_table(self, table):
+        """Appends rows read back from a shard, re-batched into row groups of row_group_size."""
+        for row in table.to_pylist():
+            self._jsonl.write(json.dumps(row, ensure_ascii=False) + "\n")
+            # CSV has no nested values, so messages are stored as a JSON string
+            self._csv.writerow({**row, "messages": json.dumps(row["messages"], ensure_ascii=False)})
+        self.rows += table.num_rows
+        self._buffer.append(table)
+        self._buffered += table.num_rows
+        if self._buffered >= self.row_group_size:
+            self._flush(final=False)
+
+    def _flush(self, final=True):
+        """Writes full row groups; the remainder stays buffered unless this is the final flush."""
+        if not self._buffer:
+            return
+        table = pa.concat_tables(self._buffer)
+        full = table.num_rows if final else table.num_rows - table.num_rows % self.row_group_size
+        for offset in range(0, full, self.row_group_size):
+            self._parquet.write_table(table.slice(offset, min(self.row_group_size, full - offset)),
+                                      row_group_size=self.row_group_size)
+        rest = table.slice(full)
+        self._buffer = [rest] if rest.num_rows else []
+        self._buffered = rest.num_rows
+
+    def close(self):
+        self._flush()
+        self._parquet.close()
+        self._jsonl.close()
+        self._csv_file.close()
+        for path in self.paths.values():
+            os.replace(path + '.tmp', path)
+
+def write_shard(path, rows):
+    tmp = path + '.tmp'
+    pq.write_table(pa.Table.from_pylist(rows, schema=PARQUET_SCHEMA), tmp)
+    os.replace(tmp, path)
+
+def rebuild_outputs(manifest, sources, output_prefix, row_group_size):
+    """Concatenates the shards, in input order, into the combined CSV/JSONL/Parquet files."""
+    writer = HarmonyWriter(output_prefix, row_group_size)
+    for source in sources:
+        shard = pq.ParquetFile(os.path.join(manifest.shard_dir, manifest.files[source]["shard"]))
+        for i in range(shard.num_row_groups):
+            writer.write_table(shard.read_row_group(i))
+    writer.close()
+    return writer.rows
+
+def run_conversion(input_dir='.', output_prefix=OUTPUT_PREFIX, workers=None, recursive=True,
+                   row_group_size=ROW_GROUP_SIZE, tokenizer=TOKENIZER, max_tokens=MAX_TOKENS,
+                   overlap_tokens=OVERLAP_TOKENS, dedup=DEDUP_MODE, dedup_index=None, full=False):
+    paths = output_paths(output_prefix)
+    settings = {"tokenizer": tokenizer, "max_tokens": max_tokens, "overlap_tokens": overlap_tokens,
+                "dedup": dedup, "columns": COLUMNS}
+    manifest = Manifest(paths["manifest"], paths["shards"], settings, full)
+
+    files = find_input_files(input_dir, output_prefix, recursive)
+    sources = [os.path.relpath(f, input_dir) for f in files]
+    removed = manifest.prune(set(sources))
+    todo = [f for f, source in zip(files, sources) if manifest.needs_conversion(source, f)]
+    todo_mb = sum(os.path.getsize(f) for f in todo) / 2**20
+    print(f"{len(files)} files in {os.path.abspath(input_dir)}: converting {len(todo)} new or changed "
+          f"({todo_mb:.1f} MB), {len(files) - len(todo)} unchanged, {len(removed)} removed")
+    # built is only saved after a rebuild finishes, so an interrupted one is redone
+    if not todo and not removed and manifest.built and all(os.path.exists(paths[k]) for k in ("csv", "jsonl", "parquet")):
+        manifest.save()
+        print("Nothing to do; outputs are up to date.")
+        return
+
+    index = None
+    if dedup != "off":
+        index = DuplicateIndex(dedup_index or output_prefix + ".minhash.npz")
+        index.forget(removed)  # A renamed or moved file must not match its old name
+
+    start = last_report = time.perf_counter()
+    done_files, done_mb, new_rows = 0, 0.0, 0
+    workers = min(workers or os.cpu_count() or 1, max(len(todo), 1))
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                 initargs=(tokenizer, max_tokens, overlap_tokens, index is not None)) as executor:
+            for file_path, rows in map_in_order(executor, convert_file, todo, window=workers * 2):
+                source = os.path.relpath(file_path, input_dir)
+                kept = []
+                for row in rows:
+                    keys = row.pop("_bands", None)
+                    duplicate_of = index.check_and_add(keys, source) if index else None
+                    if duplicate_of:
+                        if dedup == "drop":
+                            continue
+                        row["duplicate_of"] = duplicate_of
+                    kept.append(row)
+                # Each input file owns one shard; only new or changed files rewrite theirs
+                write_shard(manifest.shard_path(source), kept)
+                manifest.update(source, file_path, len(kept))
+                new_rows += len(kept)
+                done_files += 1
+                done_mb += os.path.getsize(file_path) / 2**20
+                now = time.perf_counter()
+                if now - last_report >= PROGRESS_INTERVAL:
+                    last_report = now
+                    manifest.save()
+                    elapsed = now - start
+                    print(f"{done_files}/{len(todo)} files, {new_rows} rows | "
+                          f"{done_files / elapsed:.1f} files/s, {done_mb / elapsed:.2f} MB/s")
+    manifest.save()
+    if index:
+        index.save()
+
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    print(f"Processed {done_files} files in {elapsed:.1f}s ({done_files / elapsed:.1f} files/s, {done_mb / elapsed:.2f} MB/s)")
+    if index:
+        action = "Dropped" if dedup == "drop" else "Flagged"
+        print(f"{action} {index.duplicates} near-duplicate chunks (index: {index.path})")
+
+    total_rows = rebuild_outputs(manifest, sources, output_prefix, row_group_size)
+    manifest.built = True
+    manifest.save()
+    print(f"Success! Created {total_rows} rows with reasoning/developer columns.")
 
 if __name__ == "__main__":
-    run_conversion()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Convert Amharic documents into a Harmony-format dataset.")
+    parser.add_argument("input_dir", nargs="?", default=".", help="Folder to scan (default: current folder)")
+    parser.add_argument("--output-prefix", default=OUTPUT_PREFIX, help="Writes <prefix>.csv, .jsonl and .parquet")
+    parser.add_argument("--workers", type=int, default=None, help="Extraction processes (default: CPU count)")
+    parser.add_argument("--no-recursive", action="store_true", help="Only scan the top-level folder")
+    parser.add_argument("--row-group-size", type=int, default=ROW_GROUP_SIZE)
+    parser.add_argument("--tokenizer", default=TOKENIZER, help="Tokenizer used to measure chunks")
+    parser.add_argument("--max-tokens", type=int, default=MAX_TOKENS, help="Token budget per chunk")
+    parser.add_argument("--overlap-tokens", type=int, default=OVERLAP_TOKENS,
+                        help="Tokens of trailing sentences repeated at the start of the next chunk")
+    parser.add_argument("--dedup", choices=["drop", "flag", "off"], default=DEDUP_MODE,
+                        help="Drop near-duplicate chunks, or keep them with duplicate_of set")
+    parser.add_argument("--dedup-index", help="MinHash index kept across runs (default: <prefix>.minhash.npz)")
+    parser.add_argument("--full", action="store_true", help="Ignore the manifest and re-convert every file")
+    args = parser.parse_args()
+    run_conversion(args.input_dir, args.output_prefix, args.workers, not args.no_recursive, args.row_group_size,
+                   args.tokenizer, args.max_tokens, args.overlap_tokens, args.dedup, args.dedup_index, args.full)
@@ -0,0 +1,129 @@
+import os
+import re
+import json
+import zlib
+import hashlib
+import unicodedata
+import numpy as np
+
+NUM_PERM = 128
+BANDS = 16          # 16 bands of 8 rows: pairs above ~0.7 Jaccard similarity usually collide
+SHINGLE_CHARS = 5
+MAX_ENTRIES = 1_000_000
+_MERSENNE = (1 << 61) - 1
+
+# Letters that sound the same in modern Amharic and are spelled either way:
+# ሐ/ኀ -> ሀ, ሠ -> ሰ, ዐ -> አ, ፀ -> ጸ (each family has 8 vowel orders)
+_HOMOPHONES = {}
+for _src, _dst in ((0x1210, 0x1200), (0x1280, 0x1200), (0x1220, 0x1230), (0x12D0, 0x12A0), (0x1340, 0x1338)):
+    for _order in range(8):
+        _HOMOPHONES[_src + _order] = _dst + _order
+_PUNCTUATION = re.compile(r"[፠-፨\W_]+")
+
+def normalize(text):
+    """Folds spelling variants, punctuation and whitespace so copies of a text compare equal."""
+    text = unicodedata.normalize("NFC", text).lower().translate(_HOMOPHONES)
+    return _PUNCTUATION.sub(" ", text).strip()
+
+class MinHasher:
+    """MinHash signatures over character shingles, reduced to one LSH key per band."""
+
+    def __init__(self, num_perm=NUM_PERM, bands=BANDS, shingle_chars=SHINGLE_CHARS, seed=1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_chars = shingle_chars
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, 1 << 32, size=num_perm, dtype=np.uint64)
+
+    def band_keys(self, text):
+        """Returns one 63-bit key per band, or [] for text too short to compare."""
+        text = normalize(text)
+        n = self.shingle_chars
+        if len(text) < n:
+            return []
+        shingles = {zlib.crc32(text[i:i + n].encode("utf-8")) for i in range(len(text) - n + 1)}
+        hashes = np.fromiter(shingles, dtype=np.uint64, count=len(shingles))
+        # (a * h + b) mod p, with h and a below 2**32 so the product fits in 64 bits
+        signature = ((np.outer(hashes, self._a) + self._b) % _MERSENNE).min(axis=0)
+        keys = []
+        for band in range(self.bands):
+            digest = hashlib.blake2b(signature[band * self.rows:(band + 1) * self.rows].tobytes(),
+                                     digest_size=8, person=band.to_bytes(2, "little")).digest()
+            keys.append(int.from_bytes(digest, "little") >> 1)
+        return keys
+
+class DuplicateIndex:
+    """Bounded LSH index from band key to the source (file) that first produced it.
+
+    The oldest keys are evicted first once max_entries is reached. Saved to a .npz
+    file, it carries over to the next run. A match with the same source from an
+    earlier run is not a duplicate: that is the same file being converted again.
+    """
+
+    def __init__(self, path=None, max_entries=MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.run = 0
+        self.sources = []
+        self._source_ids = {}
+        self._entries = {}  # band key -> (source id, run)
+        self.duplicates = 0
+        if path and os.path.exists(path):
+            self._load()
+        self.run += 1
+
+    def _source_id(self, source):
+        if source not in self._source_ids:
+            self._source_ids[source] = len(self.sources)
+            self.sources.append(source)
+        return self._source_ids[source]
+
+    def check_and_add(self, keys, source):
+        """Returns the source this text duplicates, or None after indexing it as new."""
+        if not keys:
+            return None
+        source_id = self._source_id(source)
+        for key in keys:
+            match = self._entries.get(key)
+            if match and (match[0] != source_id or match[1] == self.run):
+                self.duplicates += 1
+                return self.sources[match[0]]
+        for key in keys:
+            self._entries.pop(key, None)
+            self._entries[key] = (source_id, self.run)
+        while len(self._entries) > self.max_entries:
+            del self._entries[next(iter(self._entries))]
+        return None
+
+    def forget(self, sources):
+        """Drops the keys of sources that are gone, so a renamed or moved file is not its own duplicate."""
+        ids = {self._source_ids[source] for source in sources if source in self._source_ids}
+        if ids:
+            self._entries = {key: entry for key, entry in self._entries.items() if entry[0] not in ids}
+
+    def _load(self):
+        with np.load(self.path) as data:
+            meta = json.loads(str(data["meta"]))
+            self.run = meta["run"]
+            for source in meta["sources"]:
+                self._source_id(source)
+            self._entries = dict(zip(data["keys"].tolist(), zip(data["source_ids"].tolist(), data["runs"].tolist())))
+
+    def save(self):
+        if not self.path:
+            return
+        values = list(self._entries.values())
+        meta = json.dumps({"run": self.run, "sources": self.sources}, ensure_ascii=False)
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            np.savez(
+                f,
+                keys=np.fromiter(self._entries.keys(), dtype=np.int64, count=len(values)),
+                source_ids=np.array([v[0] for v in values], dtype=np.int32),
+                runs=np.array([v[1] for v in values], dtype=np.int32),
+                meta=np.array(meta),
+            )
+        os.replace(tmp, self.path)
@@ -0,0 +1,89 @@
+import os
+import json
+import hashlib
+
+MANIFEST_VERSION = 1
+
+def file_sha256(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+class Manifest:
+    """Input files of the last run (size, mtime, sha256) and the shard holding each one's rows.
+
+    A file whose size and mtime are unchanged is trusted without hashing; otherwise
+    its content hash decides. Different conversion settings, or full=True, invalidate
+    every entry. built is only set once the combined outputs match the shards.
+    """
+
+    def __init__(self, path, shard_dir, settings, full=False):
+        self.path = path
+        self.shard_dir = shard_dir
+        self.settings = settings
+        self.files = {}
+        self.built = False
+        self._discarded = []  # Sources of an invalidated manifest, reported by prune()
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if not full and data.get("version") == MANIFEST_VERSION and data.get("settings") == settings:
+                self.files = data["files"]
+                self.built = data.get("built", False)
+            else:
+                if not full:
+                    print("Conversion settings changed; re-converting every file.")
+                for entry in data.get("files", {}).values():
+                    self._remove_shard(entry)
+                self._discarded = list(data.get("files", {}))
+        os.makedirs(shard_dir, exist_ok=True)
+
+    def shard_path(self, source):
+        return os.path.join(self.shard_dir, hashlib.sha1(source.encode('utf-8')).hexdigest()[:16] + '.parquet')
+
+    def needs_conversion(self, source, file_path):
+        """True when the file is new or its content changed since the last run."""
+        entry = self.files.get(source)
+        if not entry or not os.path.exists(os.path.join(self.shard_dir, entry["shard"])):
+            return True
+        stat = os.stat(file_path)
+        if entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+            return False
+        if entry["size"] == stat.st_size and entry["sha256"] == file_sha256(file_path):
+            entry["mtime"] = stat.st_mtime  # Touched but identical
+            return False
+        return True
+
+    def update(self, source, file_path, rows):
+        stat = os.stat(file_path)
+        self.built = False
+        self.files[source] = {
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "sha256": file_sha256(file_path),
+            "shard": os.path.basename(self.shard_path(source)),
+            "rows": rows,
+        }
+
+    def prune(self, sources):
+        """Forgets files that are no longer in the input folder; returns their names."""
+        removed = [source for source in self.files if source not in sources]
+        for source in removed:
+            self._remove_shard(self.files.pop(source))
+        if removed:
+            self.built = False
+        return removed + [source for source in self._discarded if source not in sources]
+
+    def _remove_shard(self, entry):
+        path = os.path.join(self.shard_dir, entry["shard"])
+        if os.path.exists(path):
+            os.remove(path)
+
+    def save(self):
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({"version": MANIFEST_VERSION, "settings": self.settings, "built": self.built,
+                       "files": self.files}, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.path)
@@ -1,59 +1,127 @@
 #!/usr/bin/env python3
+import importlib.util
 import os
+import re
 import sys
-from threading import Thread
+import threading
 import time
 
-# Automatic installation of dependencies
-try:
-    import gradio as gr
-    import torch
-    from transformers import AutoTokenizer, AutoModelForCausalLM, TextIteratorStreamer, pipeline
-    from gtts import gTTS 
-except ImportError:
+_start = time.perf_counter()
+
+# Automatic installation of missing dependencies (only when run as a script)
+REQUIRED_PACKAGES = {"gradio": "gradio", "torch": "torch", "transformers": "transformers", "accelerate": "accelerate"}
+if os.environ.get("AMHARIC_CHAT_TTS_BACKEND", "gtts") == "gtts":
+    REQUIRED_PACKAGES["gtts"] = "gTTS"  # The offline "silent" backend runs without it
+missing = [pkg for module, pkg in REQUIRED_PACKAGES.items() if importlib.util.find_spec(module) is None]
+if missing:
+    if __name__ != "__main__":
+        raise ImportError(f"Missing packages: {', '.join(missing)}")
     import subprocess
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "transformers", "torch", "accelerate", "gTTS", "gradio"])
-    import gradio as gr
-    import torch
-    from transformers import AutoTokenizer, AutoModelForCausalLM, TextIteratorStreamer, pipeline
-    from gtts import gTTS
+    subprocess.check_call([sys.executable, "-m", "pip", "install", *missing])
+
+import gradio as gr
+
+from chat_api import add_openai_routes
+from chat_audio_cache import AudioCache
+from chat_examples import EXAMPLE_PROMPTS, REPETITION_PENALTY, ExampleCache
+from chat_history import select_history
+from chat_metrics import ChatMetrics, add_metrics_route
+from chat_prefix_cache import PrefixCache
+from chat_runtime import ChatRuntime, add_health_routes
+from chat_speculative import PromptLookupDrafter
+from chat_tts import SpeechPipeline, make_backend
 
 # Model configuration
 MODEL_ID = "rasyosef/Llama-3.2-400M-Amharic-Instruct-Poems-Stories-Wikipedia"
+PRECISION = os.environ.get("AMHARIC_CHAT_PRECISION", "fp32")  # "fp32", "bf16" or "int8"
+HISTORY_TOKEN_BUDGET = int(os.environ.get("AMHARIC_CHAT_HISTORY_TOKENS", "1024"))  # Prompt tokens per turn
 AUDIO_DIR = "./audio_responses"
-os.makedirs(AUDIO_DIR, exist_ok=True)
-audio_counter = 0
+TTS_BACKEND = os.environ.get("AMHARIC_CHAT_TTS_BACKEND", "gtts")  # "gtts" or offline "silent"
+TTS_WORKERS = int(os.environ.get("AMHARIC_CHAT_TTS_WORKERS", "2"))
+AUDIO_CACHE_MB = int(os.environ.get("AMHARIC_CHAT_AUDIO_CACHE_MB", "256"))
+API_MAX_IN_FLIGHT = int(os.environ.get("AMHARIC_CHAT_API_MAX_IN_FLIGHT", "32"))
+TRACE_LOG = os.environ.get("AMHARIC_CHAT_TRACE_LOG")  # Optional JSONL file with one record per request
+# Opt-in: answer first-turn example prompts from pre-generated replies and audio
+EXAMPLE_CACHE = os.environ.get("AMHARIC_CHAT_EXAMPLE_CACHE", "0") == "1"
+EXAMPLE_CACHE_DIR = os.environ.get("AMHARIC_CHAT_EXAMPLE_CACHE_DIR", "./example_cache")
+EXAMPLE_STREAM_DELAY = 0.02  # Seconds between words when replaying a cached reply
+# UI streaming cadence: push the reply to the browser at most this often, or after this many tokens
+STREAM_INTERVAL = float(os.environ.get("AMHARIC_CHAT_STREAM_INTERVAL", "0.05"))
+STREAM_TOKENS = int(os.environ.get("AMHARIC_CHAT_STREAM_TOKENS", "16"))
+# Longest a chat request waits for the model to finish loading before giving up
+LOAD_TIMEOUT = float(os.environ.get("AMHARIC_CHAT_LOAD_TIMEOUT", "600"))
 
 # High-Quality Profile Pictures
 BOT_AVATAR = "https://cdn-icons-png.flaticon.com/512/3702/3702165.png"
 USER_AVATAR = "https://cdn-icons-png.flaticon.com/512/17701/17701286.png"
 
-# Load model and tokenizer
-print(f"Loading model: {MODEL_ID}")
-tokenizer = AutoTokenizer.from_pretrained(MODEL_ID)
-model = AutoModelForCausalLM.from_pretrained(
-    MODEL_ID,
-    torch_dtype=torch.float32,
-    device_map="auto"
-)
-
-llama3_am = pipeline(
-    "text-generation",
-    model=model,
-    tokenizer=tokenizer,
-    eos_token_id=tokenizer.eos_token_id,
-)
-
-def text_to_speech_free(text, audio_count):
-    """Free Amharic TTS using gTTS"""
-    try:
-        audio_file = os.path.join(AUDIO_DIR, f"response_{audio_count}.mp3")
-        tts = gTTS(text=text, lang='am')
-        tts.save(audio_file)
-        return audio_file
-    except Exception as e:
-        print(f"TTS Error: {e}")
-        return None
+# One engine thread owns the model and batches every session's decode steps
+MAX_BATCH_SIZE = int(os.environ.get("AMHARIC_CHAT_MAX_BATCH", "8"))
+# Per-session KV caches so each turn only prefills the new message
+PREFIX_CACHE_MB = int(os.environ.get("AMHARIC_CHAT_PREFIX_CACHE_MB", "512"))
+PREFIX_CACHE_SESSIONS = int(os.environ.get("AMHARIC_CHAT_PREFIX_CACHE_SESSIONS", "64"))
+prefix_cache = PrefixCache(max_sessions=PREFIX_CACHE_SESSIONS, max_bytes=PREFIX_CACHE_MB * 1024 * 1024)
+# Optional speculative decoding with drafts looked up in the conversation itself
+SPECULATIVE = os.environ.get("AMHARIC_CHAT_SPECULATIVE", "0") == "1"
+DRAFT_TOKENS = int(os.environ.get("AMHARIC_CHAT_DRAFT_TOKENS", "8"))
+drafter = PromptLookupDrafter(num_draft_tokens=DRAFT_TOKENS) if SPECULATIVE else None
+
+# The model loads in the background once the UI is serving; see /health and /ready
+runtime = ChatRuntime(MODEL_ID, PRECISION, max_batch_size=MAX_BATCH_SIZE, prefix_cache=prefix_cache, drafter=drafter)
+
+# Per-phase request timings, exported on /metrics
+metrics = ChatMetrics(trace_path=TRACE_LOG)
+
+# Sentences are voiced by a worker pool while the rest of the reply is still decoding
+audio_cache = AudioCache(AUDIO_DIR, max_bytes=AUDIO_CACHE_MB * 1024 * 1024)
+speech = SpeechPipeline(make_backend(TTS_BACKEND), audio_cache, workers=TTS_WORKERS, metrics=metrics)
+
+# Session id -> (streamer, speech stream) of the reply being generated for it
+active_replies = {}
+
+
+def cancel_reply(session_id, reason):
+    """Stops a session's in-flight generation and its pending audio."""
+    reply = active_replies.pop(session_id, None) if session_id else None
+    if reply:
+        streamer, reply_audio = reply
+        streamer.cancel(reason)
+        if reply_audio:
+            reply_audio.cancel()
+
+example_cache = ExampleCache(EXAMPLE_CACHE_DIR, MODEL_ID, PRECISION, speech.backend) if EXAMPLE_CACHE else None
+
+
+def build_example_cache():
+    """Fills in missing example replies once the model is ready (startup build mode)."""
+    if runtime.wait_ready() and not example_cache.complete:
+        try:
+            example_cache.build(runtime.engine)
+        except Exception as e:
+            print(f"Example Cache Error: {e}")
+
+metrics.gauge("cancelled_requests_total", "Generations stopped early by disconnect, clear or a newer message",
+              lambda: runtime.engine.cancelled_requests if runtime.engine else 0, "counter")
+metrics.gauge("cancelled_saved_tokens_total", "Tokens of max_new_tokens not decoded thanks to cancellation",
+              lambda: runtime.engine.saved_tokens if runtime.engine else 0, "counter")
+metrics.gauge("engine_active_sequences", "Sequences in the running decode batch",
+              lambda: runtime.engine.active if runtime.engine else 0)
+metrics.gauge("engine_pending_requests", "Requests waiting to join the batch",
+              lambda: runtime.engine.pending if runtime.engine else 0)
+metrics.gauge("speculative_drafted_tokens_total", "Tokens proposed by the drafter",
+              lambda: runtime.engine.drafted_tokens if runtime.engine else 0, "counter")
+metrics.gauge("speculative_accepted_tokens_total", "Drafted tokens accepted by the model",
+              lambda: runtime.engine.accepted_tokens if runtime.engine else 0, "counter")
+metrics.gauge("prefix_cache_hits_total", "Turns that reused a cached prefix", lambda: prefix_cache.hits, "counter")
+metrics.gauge("prefix_cache_misses_total", "Turns prefilled from scratch", lambda: prefix_cache.misses, "counter")
+metrics.gauge("prefix_cache_reused_tokens_total", "Prompt tokens not prefilled thanks to the cache",
+              lambda: prefix_cache.reused_tokens, "counter")
+metrics.gauge("prefix_cache_bytes", "Memory held by cached KV tensors", lambda: prefix_cache.total_bytes)
+metrics.gauge("example_cache_hits_total", "First-turn example prompts served from the example cache",
+              lambda: example_cache.hits if example_cache else 0, "counter")
+metrics.gauge("tts_cache_hits_total", "Sentences served from the audio cache", lambda: audio_cache.hits, "counter")
+metrics.gauge("tts_cache_misses_total", "Sentences synthesized", lambda: audio_cache.misses, "counter")
+metrics.gauge("tts_cache_bytes", "Disk used by the audio cache", lambda: audio_cache.total_bytes)
 
 # Custom CSS for clean chat interface
 custom_css = """
@@ -106,7 +174,7 @@ with gr.Blocks(css=custom_css, theme=gr.themes.Soft(), title="Amharic AI Chat")
         )
         
         with gr.Group(visible=False, elem_id="minimal-audio") as audio_group:
-            audio_output = gr.Audio(label=None, interactive=False, autoplay=True, show_label=False, container=False)
+            audio_output = gr.Audio(label=None, interactive=False, autoplay=True, streaming=True, show_label=False, container=False)
         
         with gr.Row(elem_id="input-row"):
             msg = gr.Textbox(
@@ -120,32 +188,7 @@ with gr.Blocks(css=custom_css, theme=gr.themes.Soft(), title="Amharic AI Chat")
         
         gr.Markdown("### 💡 የጥያቄ መነሻዎች")
         gr.Examples(
-            examples=[
-                ["ሰላም"],
-                ["ሰላም፣ እንዴት ነህ?"],
-                ["አንተ ማንህ?"],
-                ["ስለ ኢትዮጵያ የዘመን አቆጣጠር ንገረኝ?"],
-                ["የአባይ ወንዝ መነሻና መደረሻ የት ነው?"],
-                ["ስለ አቡሸከር (የዘመን ስሌት) ምን ይታወቃል?"],
-                ["ለእናቴ የሚሆን አጭር የፍቅር ግጥም ጻፍልኝ?"],
-                ["ሰው ሰራሽ አስተውሎት (AI) ምንድን ነው?"],
-                ["ስለ አክሱም ሥልጣን ታሪካዊ ውይይታ አብራራልኝ?"],
-                ["ጥሩ የጤና አጠባበቅ ምክሮችን ንገረኝ?"],
-                ["አጭርና አስቂኝ ቀልድ ንገረኝ?"],
-                ["ግጥም ጻፍልኝ"],
-                ["ስለ ይቅርታ ግጥም ጻፍልኝ"],
-                ["አንድ ተረት አጫውተኝ"],
-                ["ስለ ጽጉብና አንበሳ ተረት ንገረኝ"],
-                ["ቀልድ ንገረኝ"],
-                ["ስለ ስራ አጥነት አንድ ቀልድ ንገረኝ"],
-                ["ዳግማዊ ቴዎድሮስ ማን ነው?"],
-                ["ዳግማዊ ምኒልክ ማን ነው?"],
-                ["ስለ አዲስ አበባ ዩኒቨርስቲ ጥቂት እውነታዎችን አጫውተኝ"],
-                ["ስለ ጃፓን ጥቂት እውነታዎችን ንገረኝ"],
-                ["ስለ ማይክሮሶፍት ጥቂት እውነታዎችን ንገረኝ"],
-                ["ጉጉል ምንድን ነው?"],
-                ["ቢትኮይን ምንድን ነው?"]
-            ],
+            examples=[[prompt] for prompt in EXAMPLE_PROMPTS],
             inputs=msg,
             examples_per_page=12
         )
@@ -157,9 +200,10 @@ with gr.Blocks(css=custom_css, theme=gr.themes.Soft(), title="Amharic AI Chat")
                 voice_enabled = gr.Checkbox(label="ድምጽ ይበራ", value=True)
                 clear_btn = gr.Button("ታሪክ አጽዳ", variant="stop")
         
-        gr.HTML("""
+        gr.HTML(f"""
         <div class="footer-section">
             <p>በ Llama 3.2 Amharic እና gTTS የተገነባ</p>
+            <p>Precision: {PRECISION}</p>
             <p>Credits: <a href="#">@rasyosef</a> & <a href="#">@ababiya</a></p>
         </div>
         """)
@@ -167,48 +211,155 @@ with gr.Blocks(css=custom_css, theme=gr.themes.Soft(), title="Amharic AI Chat")
     def user(user_message, history):
         return "", history + [{"role": "user", "content": user_message}, {"role": "assistant", "content": ""}]
 
-    def bot(history, max_tokens, voice_enabled):
-        global audio_counter
-        
+    def replay_cached(history, entry, voice_enabled):
+        audio_files = example_cache.audio_paths(entry) if voice_enabled else []
+        for audio_file in audio_files:
+            yield history, audio_file, gr.update(visible=True)
+        shown = ""
+        for word in re.findall(r"\S+\s*", entry["reply"]):
+            shown += word
+            history[-1]["content"] = shown.strip()
+            yield history, None, gr.update(visible=bool(audio_files))
+            time.sleep(EXAMPLE_STREAM_DELAY)
+        history[-1]["content"] = entry["reply"]
+        yield history, None, gr.update(visible=bool(audio_files))
+
+    def bot(history, max_tokens, voice_enabled, request: gr.Request):
+        start = time.perf_counter()
         user_message = history[-2]["content"]
         
-        recent_history = history[:-2][-6:]
-        formatted_history = []
-        for msg in recent_history:
-            formatted_history.append(msg)
-        formatted_history.append({"role": "user", "content": user_message})
+        cached = example_cache.lookup(history[:-2], user_message, max_tokens) if example_cache else None
+        if cached:
+            yield from replay_cached(history, cached, voice_enabled)
+            return
         
-        streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
+        if not runtime.ready:
+            # Also starts the model when the demo was launched without running this file as a script
+            runtime.start()
+            history[-1]["content"] = "⏳ ሞዴሉ በመጫን ላይ ነው..."
+            yield history, None, gr.update(visible=False)
+            if not runtime.wait_ready(LOAD_TIMEOUT):
+                if runtime.status == "failed":
+                    history[-1]["content"] = "❌ ሞዴሉን መጫን አልተቻለም።"
+                else:
+                    history[-1]["content"] = "⌛ ሞዴሉ በጊዜው አልተጫነም፤ እባክዎ ትንሽ ቆይተው እንደገና ይሞክሩ።"
+                yield history, None, gr.update(visible=False)
+                return
+            history[-1]["content"] = ""
         
-        thread = Thread(target=llama3_am, kwargs={
-            "text_inputs": formatted_history,
-            "max_new_tokens": max_tokens,
-            "repetition_penalty": 1.1,
-            "streamer": streamer
-        })
-        thread.start()
+        formatted_history = select_history(
+            history[:-2],
+            {"role": "user", "content": user_message},
+            HISTORY_TOKEN_BUDGET,
+            runtime.token_counter
+        )
         
-        generated_text = ""
-        for word in streamer:
-            generated_text += word
-            history[-1]["content"] = generated_text.strip()
-            yield history, None, gr.update(visible=False)
+        session_id = request.session_hash if request else None
+        # A new message supersedes whatever this session was still generating
+        cancel_reply(session_id, "superseded")
+        streamer = runtime.engine.submit(
+            formatted_history,
+            max_new_tokens=max_tokens,
+            repetition_penalty=REPETITION_PENALTY,
+            session_id=session_id
+        )
         
-        audio_file = None
-        if voice_enabled and generated_text.strip():
-            audio_counter += 1
-            audio_file = text_to_speech_free(generated_text.strip(), audio_counter)
+        reply_audio = speech.start_reply() if voice_enabled else None
+        if session_id:
+            active_replies[session_id] = (streamer, reply_audio)
+        has_audio = False
+        first_chunk_s = first_audio_s = None
         
-        yield history, audio_file, gr.update(visible=(audio_file is not None))
+        # Tokens are buffered and pushed on a time/token cadence instead of one update per
+        # token; Gradio only sends the diff of each update, so the payload stays small too.
+        pending = []
+        last_push = time.perf_counter()
+        
+        def push():
+            text = "".join(pending)
+            pending.clear()
+            history[-1]["content"] += text if history[-1]["content"] else text.lstrip()
+        
+        try:
+            for word in streamer:
+                # Once cancelled, stop updating the chat so a cleared or newer conversation is not overwritten
+                if streamer.cancellation.cancelled:
+                    break
+                pending.append(word)
+                if reply_audio:
+                    reply_audio.feed(word)
+                    for audio_file in reply_audio.ready():
+                        first_audio_s = first_audio_s or time.perf_counter() - start
+                        has_audio = True
+                        push()
+                        yield history, audio_file, gr.update(visible=True)
+                now = time.perf_counter()
+                # The first visible text goes out at once so time-to-first-chunk is unaffected
+                if pending and (first_chunk_s is None or len(pending) >= STREAM_TOKENS or now - last_push >= STREAM_INTERVAL):
+                    push()
+                    if history[-1]["content"]:
+                        first_chunk_s = first_chunk_s or now - start
+                        last_push = now
+                        yield history, None, gr.update(visible=has_audio)
+            if streamer.cancellation.cancelled:
+                return
+            
+            push()
+            history[-1]["content"] = history[-1]["content"].rstrip()
+            yield history, None, gr.update(visible=has_audio)
+            
+            if reply_audio:
+                reply_audio.finish()
+                for audio_file in reply_audio.drain():
+                    first_audio_s = first_audio_s or time.perf_counter() - start
+                    has_audio = True
+                    yield history, audio_file, gr.update(visible=True)
+        finally:
+            # Also runs when Gradio closes the generator because the client went away
+            streamer.cancel("disconnected")
+            if reply_audio:
+                reply_audio.cancel()
+            if session_id and active_replies.get(session_id, (None,))[0] is streamer:
+                del active_replies[session_id]
+        
+        metrics.observe_generation(
+            streamer, "ui", first_chunk_s,
+            first_audio_s=first_audio_s,
+            tts_sentences=reply_audio.sentences if reply_audio else 0,
+            tts_seconds=reply_audio.tts_seconds if reply_audio else 0.0,
+            tts_audio_bytes=reply_audio.audio_bytes if reply_audio else 0
+        )
+        yield history, None, gr.update(visible=has_audio)
 
-    # Event handlers
-    msg.submit(user, [msg, chatbot], [msg, chatbot], queue=False).then(
-        bot, [chatbot, max_tokens, voice_enabled], [chatbot, audio_output, audio_group]
+    # Event handlers. Gradio runs one event at a time by default; both bot events share
+    # one concurrency group, so allow a full engine batch of sessions through it.
+    submit_event = msg.submit(user, [msg, chatbot], [msg, chatbot], queue=False).then(
+        bot, [chatbot, max_tokens, voice_enabled], [chatbot, audio_output, audio_group],
+        concurrency_limit=MAX_BATCH_SIZE
     )
-    send_btn.click(user, [msg, chatbot], [msg, chatbot], queue=False).then(
-        bot, [chatbot, max_tokens, voice_enabled], [chatbot, audio_output, audio_group]
+    click_event = send_btn.click(user, [msg, chatbot], [msg, chatbot], queue=False).then(
+        bot, [chatbot, max_tokens, voice_enabled], [chatbot, audio_output, audio_group],
+        concurrency_limit=MAX_BATCH_SIZE
     )
-    clear_btn.click(fn=lambda: ([], None, gr.update(visible=False)), outputs=[chatbot, audio_output, audio_group])
+    def clear(request: gr.Request):
+        if request:
+            cancel_reply(request.session_hash, "cleared")
+            prefix_cache.drop(request.session_hash)
+        return [], None, gr.update(visible=False)
+
+    clear_btn.click(fn=clear, outputs=[chatbot, audio_output, audio_group], cancels=[submit_event, click_event])
 
 if __name__ == "__main__":
-    demo.launch(server_name="0.0.0.0", server_port=7860, favicon_path=BOT_AVATAR)
\ No newline at end of file
+    import uvicorn
+    from fastapi import FastAPI
+
+    app = FastAPI()
+    add_health_routes(app, runtime)
+    add_openai_routes(app, runtime, MODEL_ID, max_in_flight=API_MAX_IN_FLIGHT, metrics=metrics)
+    add_metrics_route(app, metrics)
+    app = gr.mount_gradio_app(app, demo, path="/")
+    runtime.timings["ui_s"] = round(time.perf_counter() - _start, 3)
+    runtime.start()
+    if example_cache:
+        threading.Thread(target=build_example_cache, name="example-cache", daemon=True).start()
+    uvicorn.run(app, host="0.0.0.0", port=7860)
\ No newline at end of file
@@ -1,87 +1,223 @@
 import os
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image
 import torch
-from transformers import AutoProcessor, AutoTokenizer
-from ctransformers import AutoModelForCausalLM
+from transformers import AutoProcessor
+try:
+    from transformers import AutoModelForImageTextToText as AutoVisionModel
+except ImportError:  # transformers < 4.46
+    from transformers import AutoModelForVision2Seq as AutoVisionModel
+from model_registry import get_registry
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.bmp')
+PROMPT = "Describe this image in detail:"
+MANIFEST_NAME = ".captions.json"
+BATCH_SIZE = 4
+MAX_NEW_TOKENS = 100
+SAVE_EVERY = 10  # Batches between manifest saves
 
 def find_model(model_dir):
-    gguf_files = [f for f in os.listdir(model_dir) if f.endswith('.gguf')]
-    if not gguf_files:
-        print(f"No .gguf model files found in {model_dir}")
-        return None
-    if len(gguf_files) > 1:
-        print(f"Multiple .gguf files found. Using the first one: {gguf_files[0]}")
-    return os.path.join(model_dir, gguf_files[0])
-
-def load_vision_model(model_path):
+    """The folder itself when it holds a transformers vision model, otherwise None.
+
+    GGUF files are run by ctransformers, which only takes text, so they cannot
+    caption images; a LLaVA-style checkpoint folder takes batched pixel_values.
+    """
+    if os.path.exists(os.path.join(model_dir, "config.json")):
+        return model_dir
+    gguf_files = get_registry(model_dir).find(('.gguf',))
+    if gguf_files:
+        print(f"{gguf_files[0]} is a GGUF model; ctransformers runs text-only models and cannot take images.")
+        print("Please point to a transformers vision model folder (e.g. a LLaVA checkpoint) instead.")
+    else:
+        print(f"No vision model found in {model_dir}")
+    return None
+
+def load_vision_model(model_dir):
     try:
-        model = AutoModelForCausalLM.from_pretrained(model_path, model_type="llama")
-        processor = AutoProcessor.from_pretrained("NousResearch/Nous-Hermes-2-Vision")
-        tokenizer = AutoTokenizer.from_pretrained("NousResearch/Nous-Hermes-2-Vision")
-        return model, processor, tokenizer
+        device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        dtype = torch.float16 if device == 'cuda' else torch.float32
+        processor = AutoProcessor.from_pretrained(model_dir)
+        model = AutoVisionModel.from_pretrained(model_dir, torch_dtype=dtype, low_cpu_mem_usage=True)
+        model.to(device).eval()
+        return model, processor
     except Exception as e:
         print(f"Error loading model: {e}")
-        return None, None, None
+        return None, None
+
+def find_images(root):
+    """Images under root and its sub-folders, as paths relative to root."""
+    images = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith('.'))
+        images.extend(os.path.relpath(os.path.join(dirpath, f), root)
+                      for f in sorted(filenames) if f.lower().endswith(IMAGE_EXTENSIONS))
+    return images
+
+def caption_path(image_path):
+    return os.path.splitext(image_path)[0] + ".txt"
+
+class CaptionManifest:
+    """Size and mtime of every captioned image, so unchanged images are skipped next run."""
+
+    def __init__(self, root):
+        self.root = root
+        self.path = os.path.join(root, MANIFEST_NAME)
+        self.images = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.images = json.load(f)
+
+    def needs_caption(self, image):
+        path = os.path.join(self.root, image)
+        stat = os.stat(path)
+        if not os.path.exists(caption_path(path)):
+            return True
+        entry = self.images.get(image)
+        if entry:
+            return entry["size"] != stat.st_size or entry["mtime"] != stat.st_mtime
+        if os.path.getmtime(caption_path(path)) >= stat.st_mtime:
+            self.update(image)  # Captioned before the manifest existed
+            return False
+        return True
+
+    def update(self, image):
+        stat = os.stat(os.path.join(self.root, image))
+        self.images[image] = {"size": stat.st_size, "mtime": stat.st_mtime}
+
+    def save(self):
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.images, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.path)
+
+def prefetch_batches(executor, load, items, batch_size):
+    """Yields (batch, results) in order; the next batch is loading while the caller uses this one."""
+    pending = None
+    for start in range(0, len(items) + batch_size, batch_size):
+        batch = items[start:start + batch_size]
+        submitted = (batch, [executor.submit(load, item) for item in batch]) if batch else None
+        if pending:
+            yield pending[0], [future.result() for future in pending[1]]
+        pending = submitted
 
-def caption_image(image_path, model, processor, tokenizer):
+def load_pixel_values(path, processor):
+    """Decodes and preprocesses one image; runs on the prefetch threads."""
     try:
-        image = Image.open(image_path)
-        inputs = processor(images=image, return_tensors="pt")
-        
-        pixel_values = inputs.pixel_values
-        prompt = "Describe this image in detail:"
-        input_ids = tokenizer(prompt, return_tensors="pt").input_ids
+        with Image.open(path) as image:
+            image = image.convert("RGB")
+        return processor.image_processor(images=image, return_tensors="pt").pixel_values
+    except Exception as e:
+        return e
+
+def prompt_inputs(processor):
+    """Token ids of the captioning prompt, shared by every image in a batch.
+
+    The processor expands the image placeholder to the model's number of image
+    tokens; that number does not depend on the image, so a blank one is used.
+    """
+    conversation = [{"role": "user", "content": [{"type": "image"}, {"type": "text", "text": PROMPT}]}]
+    if getattr(processor, "chat_template", None):
+        text = processor.apply_chat_template(conversation, add_generation_prompt=True)
+    else:
+        text = f"USER: <image>\n{PROMPT} ASSISTANT:"
+    inputs = processor(text=text, images=Image.new("RGB", (64, 64)), return_tensors="pt")
+    return inputs.input_ids, inputs.attention_mask
 
+def caption_batch(pixel_values, model, processor, prompt, max_new_tokens=MAX_NEW_TOKENS):
+    input_ids, attention_mask = prompt
+    count = len(pixel_values)
+    with torch.no_grad():
         outputs = model.generate(
-            input_ids=input_ids,
-            pixel_values=pixel_values,
-            max_new_tokens=100,
-            num_return_sequences=1,
+            input_ids=input_ids.repeat(count, 1).to(model.device),
+            attention_mask=attention_mask.repeat(count, 1).to(model.device),
+            pixel_values=torch.cat(pixel_values).to(model.device, model.dtype),
+            max_new_tokens=max_new_tokens,
         )
-        
-        caption = tokenizer.decode(outputs[0], skip_special_tokens=True)
-        return caption
-    except Exception as e:
-        print(f"Error processing image {image_path}: {e}")
-        return None
+    # generate() returns the prompt too; only the new tokens are the caption
+    return processor.batch_decode(outputs[:, input_ids.shape[1]:], skip_special_tokens=True)
+
+def write_caption(image_path, caption):
+    with open(caption_path(image_path), "w", encoding="utf-8") as f:
+        f.write(f"Image: {os.path.basename(image_path)}\n")
+        f.write(f"Caption: {caption}\n")
 
-def main():
-    model_dir = input("Please enter the full path to the directory containing the vision model: ")
+def main(images_dir=".", model_dir=None, batch_size=BATCH_SIZE, workers=None,
+         max_new_tokens=MAX_NEW_TOKENS, force=False):
+    if not model_dir:
+        model_dir = input("Please enter the full path to the directory containing the vision model: ")
 
     model_path = find_model(model_dir)
     if not model_path:
         return
 
-    model, processor, tokenizer = load_vision_model(model_path)
-    if model is None or processor is None or tokenizer is None:
+    model, processor = load_vision_model(model_path)
+    if model is None or processor is None:
         return
+    prompt = prompt_inputs(processor)
 
-    current_dir = os.getcwd()
-    image_extensions = ['.jpg', '.jpeg', '.png', '.gif', '.bmp']
-    image_files = [f for f in os.listdir(current_dir) if any(f.lower().endswith(ext) for ext in image_extensions)]
-
-    if not image_files:
-        print("No images found in the current directory.")
+    images = find_images(images_dir)
+    if not images:
+        print(f"No images found in {os.path.abspath(images_dir)}.")
         return
 
-    for image_file in image_files:
-        image_path = os.path.join(current_dir, image_file)
-        caption = caption_image(image_path, model, processor, tokenizer)
-        
-        if caption:
-            txt_file = os.path.splitext(image_file)[0] + ".txt"
-            txt_path = os.path.join(current_dir, txt_file)
-            
-            with open(txt_path, "w", encoding="utf-8") as f:
-                f.write(f"Image: {image_file}\n")
-                f.write(f"Caption: {caption}\n")
-            
-            print(f"Processed: {image_file}")
-            print(f"Caption saved to: {txt_file}")
-        else:
-            print(f"Failed to process: {image_file}")
-
-    print("All images processed.")
+    manifest = CaptionManifest(images_dir)
+    todo = images if force else [image for image in images if manifest.needs_caption(image)]
+    print(f"{len(images)} images found, {len(images) - len(todo)} already captioned.")
+
+    captioned = failed = 0
+    start = time.perf_counter()
+    # Threads decode and preprocess the next batches while the current one is generating
+    with ThreadPoolExecutor(workers or min(8, os.cpu_count() or 1)) as executor:
+        prefetched = prefetch_batches(executor, lambda image: load_pixel_values(os.path.join(images_dir, image), processor),
+                                      todo, batch_size)
+        try:
+            for i, (batch, results) in enumerate(prefetched, 1):
+                ready = []
+                for image, pixel_values in zip(batch, results):
+                    if isinstance(pixel_values, Exception):
+                        print(f"Error processing image {image}: {pixel_values}")
+                        failed += 1
+                    else:
+                        ready.append((image, pixel_values))
+                if not ready:
+                    continue
+
+                try:
+                    captions = caption_batch([p for _, p in ready], model, processor, prompt, max_new_tokens)
+                except Exception as e:
+                    print(f"Error captioning batch starting at {ready[0][0]}: {e}")
+                    failed += len(ready)
+                    continue
+
+                for (image, _), caption in zip(ready, captions):
+                    if not caption.strip():
+                        print(f"Failed to process: {image}")
+                        failed += 1
+                        continue
+                    write_caption(os.path.join(images_dir, image), caption)
+                    manifest.update(image)
+                    captioned += 1
+                elapsed = time.perf_counter() - start
+                print(f"Captioned {captioned}/{len(todo)} ({captioned / elapsed * 60:.1f} images/min)")
+                if i % SAVE_EVERY == 0:
+                    manifest.save()
+        finally:
+            manifest.save()
+
+    elapsed = time.perf_counter() - start
+    rate = captioned / elapsed * 60 if elapsed else 0.0
+    print(f"All images processed: {captioned} captioned, {failed} failed in {elapsed:.1f}s ({rate:.1f} images/min).")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Caption every image under a folder with a vision model.")
+    parser.add_argument("images_dir", nargs="?", default=".", help="Folder to caption, sub-folders included (default: current folder)")
+    parser.add_argument("--model-dir", help="Folder holding a transformers vision model (asked for when omitted)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=None, help="Image decoding threads (default: CPU count, at most 8)")
+    parser.add_argument("--max-new-tokens", type=int, default=MAX_NEW_TOKENS)
+    parser.add_argument("--force", action="store_true", help="Caption every image, even unchanged ones")
+    args = parser.parse_args()
+    main(args.images_dir, args.model_dir, args.batch_size, args.workers, args.max_new_tokens, args.force)
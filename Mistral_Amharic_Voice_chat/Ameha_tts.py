@@ -1,11 +1,5 @@
-import asyncio
-import edge_tts
 import os
-
-async def text_to_speech(text, output_file):
-    voice = "am-ET-MekdesNeural"  # Amharic voice
-    communicate = edge_tts.Communicate(text, voice)
-    await communicate.save(output_file)
+from tts_service import TTSService
 
 def main():
     # Amharic text to convert to speech
@@ -20,10 +14,12 @@ def main():
     # Full path for the output file
     output_path = os.path.join(current_dir, output_file)
     
-    # Run the text-to-speech conversion
-    asyncio.run(text_to_speech(amharic_text, output_path))
+    # Run the text-to-speech conversion; chunks are written as they stream in
+    tts = TTSService()
+    result = tts.speak(amharic_text, output_path).result()
+    tts.close()
     
-    print(f"Speech saved to: {output_path}")
+    print(f"Speech saved to: {output_path} (first audio after {result['first_chunk_s'] or 0:.2f}s)")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,13 +1,10 @@
-import asyncio
-import edge_tts
 import os
 import openai
 from googletrans import Translator
+from tts_service import TTSService
 
-async def text_to_speech(text, output_file):
-    voice = "am-ET-MekdesNeural"  # Amharic voice
-    communicate = edge_tts.Communicate(text, voice)
-    await communicate.save(output_file)
+def announce(result):
+    print(f"\nSpeech saved to: {result['path']}")
 
 def translate_to_amharic(text):
     translator = Translator()
@@ -33,6 +30,8 @@ def main():
     current_dir = os.getcwd()
 
     conversation_count = 0
+    # One background TTS loop for the whole session; speech is made while the next input is read
+    tts = TTSService()
 
     while True:
         # Get user input
@@ -52,8 +51,9 @@ def main():
         conversation_count += 1
         output_file = f"conversation_{conversation_count}.mp3"
         output_path = os.path.join(current_dir, output_file)
-        asyncio.run(text_to_speech(amharic_response, output_path))
-        print(f"Speech saved to: {output_path}")
+        tts.speak(amharic_response, output_path, on_saved=announce)
+
+    tts.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,85 +1,71 @@
-import asyncio
-import edge_tts
 import os
 import re
-import torch
-from ctransformers import AutoModelForCausalLM as CTransformersAutoModel
-from transformers import AutoModelForCausalLM as HFModel, AutoTokenizer
+from model_registry import get_registry
+from tts_service import ENGLISH_VOICE, TTSService, make_client
 
-async def text_to_speech(text, output_file):
-    voice = "en-US-ChristopherNeural"
-    communicate = edge_tts.Communicate(text, voice)
-    await communicate.save(output_file)
+TURN_PROMPT = "\nHuman: {}\nAssistant:"
+STOP = ["\nHuman:"]
 
-def chat_with_model(model, tokenizer, prompt):
-    inputs = tokenizer(prompt, return_tensors='pt').to('cuda' if torch.cuda.is_available() else 'cpu')
-    outputs = model.generate(inputs['input_ids'], max_new_tokens=200)
-    response = tokenizer.decode(outputs[0], skip_special_tokens=True)
-    return response
+def chat_with_model(model, prompt, max_new_tokens=200):
+    """Prints the reply as it is generated and returns it.
+
+    Earlier turns stay in the model's KV cache, so follow-up prompts keep the
+    conversation as context and only the new turn is processed.
+    """
+    text = TURN_PROMPT.format(prompt)
+    model.make_room(text, max_new_tokens)  # A reset here makes this the first turn again
+    if not model.context_tokens:
+        text = text.lstrip("\n")
+    pieces = []
+    for piece in model.stream(text, max_new_tokens=max_new_tokens, stop=STOP):
+        print(piece, end="", flush=True)
+        pieces.append(piece)
+    print()
+    return "".join(pieces).strip()
 
 def sanitize_filename(filename):
     return re.sub(r'[^\w\s]', '', filename).replace(' ', '_')
 
-def load_model(model_path, model_file):
-    ext = os.path.splitext(model_file)[1]
-    model = None
-    tokenizer = None
-
-    if ext in ['.bin', '.tar.gz']:
-        try:
-            tokenizer = AutoTokenizer.from_pretrained(model_path)
-            model = HFModel.from_pretrained(model_path)
-            model.to('cuda' if torch.cuda.is_available() else 'cpu')
-            print(f"Loaded Hugging Face model: {model_path}")
-        except Exception as e:
-            print(f"Error loading Hugging Face model: {e}")
-    elif ext in ['.gguf', '.ggml']:
-        try:
-            model = CTransformersAutoModel.from_pretrained(model_path)
-            print(f"Loaded CTransformers model: {model_path}")
-        except Exception as e:
-            print(f"Error loading CTransformers model: {e}")
-    
-    return model, tokenizer
+def load_model(model_dir, model_file):
+    try:
+        backend = get_registry(model_dir).load(model_file)
+        print(f"Loaded {backend.kind} model: {os.path.join(model_dir, model_file)}")
+        return backend
+    except Exception as e:
+        print(f"Error loading model: {e}")
+        return None
 
 def main():
     model_dir = input("Please enter the full path to the directory containing your AI model: ")
     
-    model_extensions = ['.gguf', '.bin', '.ggml', '.tar.gz']
-    model_files = [f for f in os.listdir(model_dir) if any(f.endswith(ext) for ext in model_extensions)]
-    
-    if not model_files:
-        print("No compatible model files found in the specified directory.")
+    model_file = get_registry(model_dir).choose()
+    if not model_file:
         return
 
-    if len(model_files) > 1:
-        print("Multiple model files found. Please choose one:")
-        for i, file in enumerate(model_files):
-            print(f"{i + 1}. {file}")
-        choice = int(input("Enter the number of your choice: ")) - 1
-        model_file = model_files[choice]
-    else:
-        model_file = model_files[0]
-
-    model_path = os.path.join(model_dir, model_file)
-    model, tokenizer = load_model(model_path, model_file)
-
+    model = load_model(model_dir, model_file)
     if model is None:
         print("Failed to load the model.")
         return
 
+    # One background TTS loop for the whole session; speech is made while the next input is read
+    tts = TTSService(make_client(ENGLISH_VOICE))
+
     while True:
-        prompt = input("Enter your prompt (or 'exit' to quit): ")
+        prompt = input("Enter your prompt ('reset' for a new conversation, 'exit' to quit): ")
         if prompt.lower() == 'exit':
             break
+        if prompt.lower() == 'reset':
+            model.reset()
+            continue
 
-        response = chat_with_model(model, tokenizer, prompt) if tokenizer else model(prompt, max_new_tokens=200)
-        print(f"Response: {response}")
+        print("Response: ", end="", flush=True)
+        response = chat_with_model(model, prompt)
         
         sanitized_prompt = sanitize_filename(prompt)
         output_file = f"{sanitized_prompt[:50]}.mp3"
-        asyncio.run(text_to_speech(response, output_file))
-        print(f"Audio saved as {output_file}")
+        tts.speak(response, output_file, on_saved=lambda result: print(f"\nAudio saved as {result['path']}"))
+
+    tts.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,333 @@
+import os
+import json
+import codecs
+import struct
+import threading
+
+MANIFEST_NAME = ".model_registry.json"
+MODEL_EXTENSIONS = ('.gguf', '.bin', '.ggml', '.tar.gz')
+
+GGUF_MAGIC = b"GGUF"
+GGML_MAGICS = {b"lmgg", b"fmgg", b"tjgg", b"algg"}  # ggml/ggmf/ggjt/ggla, stored little-endian
+GGUF_STRING, GGUF_ARRAY = 8, 9
+GGUF_SCALARS = {0: "<B", 1: "<b", 2: "<H", 3: "<h", 4: "<I", 5: "<i", 6: "<f", 7: "<?",
+                10: "<Q", 11: "<q", 12: "<d"}
+
+# GGUF general.architecture -> ctransformers model_type; other GGUF architectures
+# go to ctransformers' llama.cpp backend, which reads the rest from the header
+CT_MODEL_TYPES = {"llama": "llama", "mistral": "mistral", "falcon": "falcon", "gpt2": "gpt2",
+                  "gptj": "gptj", "gptneox": "gpt_neox", "mpt": "mpt", "starcoder": "starcoder"}
+# Legacy GGML files carry no architecture, so these are tried in turn (once per file)
+GGML_MODEL_TYPES = ["llama", "gpt2", "gptj", "gpt_neox", "mpt", "falcon", "starcoder"]
+
+def read_gguf_metadata(path, wanted=("general.architecture", "general.name")):
+    """Reads header key/values until every wanted key is found; tensor data is never read."""
+    with open(path, 'rb') as f:
+        if f.read(4) != GGUF_MAGIC:
+            raise ValueError(f"{path} is not a GGUF file")
+
+        def read(fmt):
+            return struct.unpack(fmt, f.read(struct.calcsize(fmt)))[0]
+
+        version = read("<I")
+        count_fmt = "<I" if version == 1 else "<Q"
+
+        def read_value(kind):
+            if kind == GGUF_STRING:
+                return f.read(read(count_fmt)).decode('utf-8', 'replace')
+            if kind == GGUF_ARRAY:  # Skipped (e.g. the tokenizer vocabulary)
+                item_kind, length = read("<I"), read(count_fmt)
+                if item_kind in GGUF_SCALARS:
+                    f.seek(length * struct.calcsize(GGUF_SCALARS[item_kind]), os.SEEK_CUR)
+                else:
+                    for _ in range(length):
+                        read_value(item_kind)
+                return None
+            if kind not in GGUF_SCALARS:
+                raise ValueError(f"Unknown GGUF value type {kind} in {path}")
+            return read(GGUF_SCALARS[kind])
+
+        read(count_fmt)  # Tensor count
+        metadata = {"gguf_version": version}
+        for _ in range(read(count_fmt)):
+            key = f.read(read(count_fmt)).decode('utf-8', 'replace')
+            value = read_value(read("<I"))
+            if key in wanted:
+                metadata[key] = value
+                if all(k in metadata for k in wanted):
+                    break
+    return metadata
+
+def probe(path):
+    """Format and architecture of a model file, from its first bytes and GGUF header."""
+    with open(path, 'rb') as f:
+        magic = f.read(4)
+    if magic == GGUF_MAGIC:
+        metadata = read_gguf_metadata(path)
+        architecture = metadata.get("general.architecture")
+        return {"format": "gguf", "architecture": architecture, "name": metadata.get("general.name"),
+                "model_type": CT_MODEL_TYPES.get(architecture, "llama")}
+    if magic in GGML_MAGICS:
+        return {"format": "ggml", "architecture": None, "name": None, "model_type": None}
+    # PyTorch checkpoints and archives: loaded by transformers from the folder
+    return {"format": "hf", "architecture": None, "name": None, "model_type": None}
+
+class StopFilter:
+    """Passes streamed text through up to the first stop string.
+
+    Text that could still become a stop string is held back, so a stop is never
+    half printed. After a stop, tail holds the stop string that matched, which the
+    model already has in its context (with anything decoded after it in the same piece).
+    """
+
+    def __init__(self, stop=None):
+        self.stop = list(stop or [])
+        self.hold = max(map(len, self.stop), default=1) - 1
+        self.tail = ""
+
+    def __call__(self, pieces):
+        text, sent = "", 0
+        for piece in pieces:
+            text += piece
+            hits = [(i, -len(s), s) for s, i in ((s, text.find(s)) for s in self.stop) if i >= 0]
+            if hits:
+                cut, _, self.tail = min(hits)  # Earliest stop; the longest one when several start there
+                if cut > sent:
+                    yield text[sent:cut]
+                return
+            end = len(text) - self.hold
+            if end > sent:
+                yield text[sent:end]
+                sent = end
+        if len(text) > sent:
+            yield text[sent:]
+
+class GGUFBackend:
+    """ctransformers model (GGUF or legacy GGML) with memory-mapped weights."""
+
+    kind = "gguf"
+
+    def __init__(self, path, model_type=None, gpu_layers=0):
+        from ctransformers import AutoModelForCausalLM
+        kwargs = {"model_type": model_type} if model_type else {}
+        self.model = AutoModelForCausalLM.from_pretrained(path, mmap=True, gpu_layers=gpu_layers, **kwargs)
+        self.tokenizer = None
+        self.model_type = model_type
+        self.context_tokens = 0
+        self.tail = ""
+
+    def generate(self, prompt, max_new_tokens=200):
+        self.context_tokens, self.tail = 0, ""  # A plain call starts from a fresh context
+        return self.model(prompt, max_new_tokens=max_new_tokens)
+
+    def reset(self):
+        """Forgets the conversation held in the model's context."""
+        self.model.reset()
+        self.context_tokens, self.tail = 0, ""
+
+    def make_room(self, text, max_new_tokens=200):
+        """Starts over when text and the reply would overflow the context; stream() calls it too."""
+        if self.context_tokens + len(self.model.tokenize(text)) + max_new_tokens > self.model.context_length:
+            self.reset()
+
+    def stream(self, text, max_new_tokens=200, stop=None):
+        """Continues the conversation with text and yields the reply as it is decoded.
+
+        Earlier turns stay evaluated in the model (reset=False), so only the new
+        tokens are processed. Each token's bytes are decoded as they arrive.
+        """
+        self.make_room(text, max_new_tokens)
+        if self.tail and text.startswith(self.tail):
+            text = text[len(self.tail):]
+        # Only the first turn gets the model's usual beginning-of-sequence token
+        tokens = self.model.tokenize(text, add_bos_token=False if self.context_tokens else None)
+        decoder = codecs.getincrementaldecoder('utf-8')('replace')
+        reset = not self.context_tokens
+        self.context_tokens += len(tokens)
+
+        def pieces():
+            for i, token in enumerate(self.model.generate(tokens, reset=reset)):
+                self.context_tokens += 1
+                yield decoder.decode(self.model.detokenize([token], decode=False))
+                if i + 1 >= max_new_tokens:
+                    break
+            yield decoder.decode(b"", final=True)
+
+        stop_filter = StopFilter(stop)
+        yield from stop_filter(pieces())
+        self.tail = stop_filter.tail
+
+class HFBackend:
+    """transformers model and tokenizer from a model folder, on the GPU when there is one."""
+
+    kind = "hf"
+    model_type = None
+
+    def __init__(self, model_dir, device=None):
+        import torch
+        from transformers import AutoModelForCausalLM, AutoTokenizer
+        self.device = device or ('cuda' if torch.cuda.is_available() else 'cpu')
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        # low_cpu_mem_usage loads safetensors shards lazily instead of building a second copy
+        self.model = AutoModelForCausalLM.from_pretrained(model_dir, low_cpu_mem_usage=True)
+        self.model.to(self.device)
+        self.max_context = getattr(self.model.config, "max_position_embeddings", 2048)
+        self.reset()
+
+    def generate(self, prompt, max_new_tokens=200):
+        inputs = self.tokenizer(prompt, return_tensors='pt').to(self.device)
+        outputs = self.model.generate(inputs['input_ids'], max_new_tokens=max_new_tokens)
+        return self.tokenizer.decode(outputs[0][inputs['input_ids'].shape[1]:], skip_special_tokens=True)
+
+    def reset(self):
+        """Forgets the conversation and its KV cache."""
+        from transformers import DynamicCache
+        self.context = None  # Token ids of every turn so far, prompts and replies
+        self.cache = DynamicCache()
+        self.tail = ""
+
+    @property
+    def context_tokens(self):
+        return 0 if self.context is None else self.context.shape[1]
+
+    def make_room(self, text, max_new_tokens=200):
+        """Starts over when text and the reply would overflow the context; stream() calls it too."""
+        if self.context_tokens + len(self.tokenizer(text).input_ids) + max_new_tokens > self.max_context:
+            self.reset()
+
+    def stream(self, text, max_new_tokens=200, stop=None):
+        """Continues the conversation with text and yields the reply as it is decoded.
+
+        The KV cache persists across calls, so generate() only runs the tokens it
+        has not seen; the streamer decodes just the newly generated tokens.
+        """
+        import torch
+        from transformers import TextIteratorStreamer
+        self.make_room(text, max_new_tokens)
+        if self.tail and text.startswith(self.tail):
+            text = text[len(self.tail):]
+        new_ids = self.tokenizer(text, add_special_tokens=self.context is None, return_tensors='pt').input_ids
+        new_ids = new_ids.to(self.device)
+        input_ids = new_ids if self.context is None else torch.cat([self.context, new_ids], dim=1)
+
+        streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True)
+        result = {}
+
+        def run():
+            try:
+                result["ids"] = self.model.generate(
+                    input_ids, attention_mask=torch.ones_like(input_ids), past_key_values=self.cache,
+                    max_new_tokens=max_new_tokens, streamer=streamer, stop_strings=stop or None,
+                    tokenizer=self.tokenizer, pad_token_id=self.tokenizer.pad_token_id or self.tokenizer.eos_token_id)
+            except Exception as e:
+                result["error"] = e
+                streamer.end()
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        stop_filter = StopFilter(stop)
+        try:
+            yield from stop_filter(streamer)
+        finally:
+            thread.join()  # The cache was extended either way, so the context must follow it
+            if "error" in result:
+                self.reset()
+            else:
+                self.context = result["ids"]
+                self.tail = stop_filter.tail
+        if "error" in result:
+            raise result["error"]
+
+class ModelRegistry:
+    """Model files of one folder, probed once and remembered in a sidecar manifest.
+
+    An entry is reused while the file's size and mtime are unchanged, so reopening
+    a model reads no header at all. Loaded backends are kept for the process.
+    """
+
+    def __init__(self, model_dir):
+        self.model_dir = model_dir
+        self.manifest_path = os.path.join(model_dir, MANIFEST_NAME)
+        self.entries = {}
+        self.probes = 0
+        self._backends = {}
+        if os.path.exists(self.manifest_path):
+            try:
+                with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                self.entries = {}
+
+    def find(self, extensions=MODEL_EXTENSIONS):
+        return sorted(f for f in os.listdir(self.model_dir) if f.lower().endswith(tuple(extensions)))
+
+    def choose(self, extensions=MODEL_EXTENSIONS):
+        """Asks which file to use when the folder holds several; None when it holds none."""
+        model_files = self.find(extensions)
+        if not model_files:
+            print("No compatible model files found in the specified directory.")
+            return None
+        if len(model_files) == 1:
+            return model_files[0]
+        print("Multiple model files found. Please choose one:")
+        for i, file in enumerate(model_files):
+            print(f"{i + 1}. {file}")
+        choice = int(input("Enter the number of your choice: ")) - 1
+        return model_files[choice]
+
+    def info(self, model_file):
+        stat = os.stat(os.path.join(self.model_dir, model_file))
+        entry = self.entries.get(model_file)
+        if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+            return entry
+        self.probes += 1
+        entry = probe(os.path.join(self.model_dir, model_file))
+        entry.update(size=stat.st_size, mtime=stat.st_mtime)
+        self.entries[model_file] = entry
+        self.save()
+        return entry
+
+    def load(self, model_file, **kwargs):
+        """Backend for the file, loaded once; keyword arguments go to the backend."""
+        if model_file in self._backends:
+            return self._backends[model_file]
+        entry = self.info(model_file)
+        if entry["format"] == "hf":
+            backend = HFBackend(self.model_dir, **kwargs)
+        elif entry["model_type"] or entry["format"] == "gguf":
+            backend = GGUFBackend(os.path.join(self.model_dir, model_file), entry["model_type"], **kwargs)
+        else:
+            backend = self._load_ggml(model_file, entry, **kwargs)
+        self._backends[model_file] = backend
+        return backend
+
+    def _load_ggml(self, model_file, entry, **kwargs):
+        path = os.path.join(self.model_dir, model_file)
+        for model_type in GGML_MODEL_TYPES:
+            try:
+                backend = GGUFBackend(path, model_type, **kwargs)
+            except Exception:
+                continue
+            entry["model_type"] = model_type  # Remembered, so the next run loads it directly
+            self.save()
+            return backend
+        raise ValueError(f"{model_file} did not load as any known model type")
+
+    def save(self):
+        """Writes the manifest; a read-only model folder only costs probing again next time."""
+        tmp = self.manifest_path + '.tmp'
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f, indent=1)
+            os.replace(tmp, self.manifest_path)
+        except OSError:
+            pass
+
+_registries = {}
+
+def get_registry(model_dir):
+    """One registry per folder for the whole process."""
+    key = os.path.abspath(model_dir)
+    if key not in _registries:
+        _registries[key] = ModelRegistry(model_dir)
+    return _registries[key]
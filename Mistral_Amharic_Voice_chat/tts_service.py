@@ -0,0 +1,163 @@
+import os
+import time
+import asyncio
+import argparse
+import threading
+import subprocess
+
+AMHARIC_VOICE = "am-ET-MekdesNeural"
+ENGLISH_VOICE = "en-US-ChristopherNeural"
+
+class EdgeTTSClient:
+    """edge-tts voice; stream() yields MP3 chunks as the service sends them."""
+
+    def __init__(self, voice=AMHARIC_VOICE):
+        self.voice = voice
+
+    async def stream(self, text):
+        import edge_tts
+        communicate = edge_tts.Communicate(text, self.voice)
+        async for chunk in communicate.stream():
+            if chunk["type"] == "audio":
+                yield chunk["data"]
+
+class StubTTSClient:
+    """Offline stand-in with edge-tts-like timing, for tests and latency benchmarks."""
+
+    def __init__(self, first_chunk_delay=0.3, chunk_delay=0.02, chars_per_chunk=20, chunk_size=2048):
+        self.first_chunk_delay = first_chunk_delay
+        self.chunk_delay = chunk_delay
+        self.chars_per_chunk = chars_per_chunk
+        self.chunk_size = chunk_size
+
+    async def stream(self, text):
+        await asyncio.sleep(self.first_chunk_delay)
+        for i in range(max(1, len(text) // self.chars_per_chunk)):
+            if i:
+                await asyncio.sleep(self.chunk_delay)
+            yield b"\x00" * self.chunk_size
+
+def make_client(voice=AMHARIC_VOICE):
+    """edge-tts by default; VOICE_CHAT_TTS=stub selects the offline stub."""
+    if os.environ.get("VOICE_CHAT_TTS") == "stub":
+        return StubTTSClient()
+    return EdgeTTSClient(voice)
+
+class PipePlayer:
+    """Feeds MP3 chunks to a player reading stdin, e.g. VOICE_CHAT_PLAYER="ffplay -nodisp -autoexit -"."""
+
+    def __init__(self, command):
+        self.process = subprocess.Popen(command, shell=True, stdin=subprocess.PIPE,
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def write(self, data):
+        try:
+            self.process.stdin.write(data)
+            self.process.stdin.flush()
+        except OSError:
+            pass
+
+    def close(self):
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+
+class TTSService:
+    """Synthesizes speech on one long-lived event loop in a background thread.
+
+    speak() returns at once with a concurrent.futures.Future, so the chat can read
+    the next input while audio is produced. Chunks are written to disk (and to an
+    optional player) as they arrive; the file gets its final name when complete.
+    """
+
+    def __init__(self, client=None, player_command=None):
+        self.client = client or make_client()
+        self.player_command = player_command if player_command is not None else os.environ.get("VOICE_CHAT_PLAYER")
+        self.loop = asyncio.new_event_loop()
+        self._pending = set()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="tts-loop", daemon=True)
+        self._thread.start()
+
+    def speak(self, text, output_path, on_saved=None):
+        future = asyncio.run_coroutine_threadsafe(self._synthesize(text, output_path), self.loop)
+        self._pending.add(future)
+        future.add_done_callback(self._pending.discard)
+        if on_saved:
+            future.add_done_callback(lambda f: not f.cancelled() and f.exception() is None and on_saved(f.result()))
+        return future
+
+    async def _synthesize(self, text, output_path):
+        start = time.perf_counter()
+        first_chunk_s = None
+        size = 0
+        player = PipePlayer(self.player_command) if self.player_command else None
+        part_path = output_path + ".part"
+        try:
+            with open(part_path, "wb") as f:
+                async for data in self.client.stream(text):
+                    if first_chunk_s is None:
+                        first_chunk_s = time.perf_counter() - start
+                    f.write(data)
+                    size += len(data)
+                    if player:
+                        player.write(data)
+            os.replace(part_path, output_path)
+        except Exception as e:
+            print(f"TTS Error: {e}")
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            raise
+        finally:
+            if player:
+                player.close()
+        return {"path": output_path, "first_chunk_s": first_chunk_s,
+                "total_s": time.perf_counter() - start, "bytes": size}
+
+    def close(self, wait=True):
+        """Waits for queued speech (unless wait=False) and stops the loop."""
+        if wait:
+            for future in list(self._pending):
+                try:
+                    future.result()
+                except Exception:
+                    pass
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+
+def benchmark(turns=10, text="ሰላም፣ ይህ የአማርኛ ንግግር ናሙና ነው። " * 4, output_dir="."):
+    """Compares asyncio.run() per reply with the shared service, using the stub client."""
+    client = StubTTSClient()
+
+    async def save(path):
+        with open(path, "wb") as f:
+            async for data in client.stream(text):
+                f.write(data)
+
+    start = time.perf_counter()
+    for i in range(turns):
+        asyncio.run(save(os.path.join(output_dir, f"bench_{i}.mp3")))
+    blocking = (time.perf_counter() - start) / turns
+
+    service = TTSService(client, player_command="")
+    results = []
+    start = time.perf_counter()
+    for i in range(turns):
+        t = time.perf_counter()
+        future = service.speak(text, os.path.join(output_dir, f"bench_{i}.mp3"))
+        results.append((time.perf_counter() - t, future))
+    service.close()
+    total = time.perf_counter() - start
+    for i in range(turns):
+        os.remove(os.path.join(output_dir, f"bench_{i}.mp3"))
+
+    first = sorted(f.result()["first_chunk_s"] for _, f in results)
+    print(f"asyncio.run per reply: prompt blocked {blocking * 1000:.1f} ms per reply")
+    print(f"TTSService: prompt blocked {max(b for b, _ in results) * 1000:.2f} ms per reply, "
+          f"first chunk p50 {first[len(first) // 2] * 1000:.1f} ms, {turns} replies done in {total:.2f}s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline latency benchmark of the shared TTS service.")
+    parser.add_argument("--turns", type=int, default=10)
+    args = parser.parse_args()
+    benchmark(args.turns)
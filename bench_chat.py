@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""Load test for the chat path: N concurrent sessions replaying multi-turn conversations.
+
+By default it runs fully offline against a tiny randomly initialized Llama model with
+a byte-level tokenizer, so it fits in CI. Use --model-id to benchmark a real model.
+
+    python bench_chat.py --sessions 8 --turns 3 --max-new-tokens 64 --output bench.json
+    python bench_chat.py --mode app --voice --sessions 4     # drive user() -> bot() with a mock TTS
+
+Results are printed and optionally written as JSON for comparing runs over time.
+"""
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+
+try:
+    import resource
+except ImportError:  # Unix only; peak RSS is reported as null on Windows
+    resource = None
+
+from chat_examples import EXAMPLE_PROMPTS as PROMPTS
+
+CHAT_TEMPLATE = (
+    "{{ bos_token }}{% for message in messages %}"
+    "<|start_header_id|>{{ message['role'] }}<|end_header_id|>\n\n{{ message['content'] }}<|eot_id|>"
+    "{% endfor %}{% if add_generation_prompt %}<|start_header_id|>assistant<|end_header_id|>\n\n{% endif %}"
+)
+
+
+def _bytes_to_unicode():
+    printable = list(range(ord("!"), ord("~") + 1)) + list(range(ord("¡"), ord("¬") + 1)) + list(range(ord("®"), ord("ÿ") + 1))
+    chars = printable[:]
+    n = 0
+    for b in range(256):
+        if b not in printable:
+            printable.append(b)
+            chars.append(256 + n)
+            n += 1
+    return [chr(c) for c in chars]
+
+
+def build_tiny_tokenizer():
+    """Byte-level tokenizer without merges: handles Ge'ez text with no downloads."""
+    from tokenizers import Tokenizer, decoders, models, pre_tokenizers
+    from transformers import PreTrainedTokenizerFast
+
+    vocab = {ch: i for i, ch in enumerate(_bytes_to_unicode())}
+    backend = Tokenizer(models.BPE(vocab=vocab, merges=[]))
+    backend.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    backend.decoder = decoders.ByteLevel()
+    tokenizer = PreTrainedTokenizerFast(tokenizer_object=backend)
+    tokenizer.add_special_tokens({
+        "bos_token": "<|begin_of_text|>",
+        "eos_token": "<|eot_id|>",
+        "additional_special_tokens": ["<|start_header_id|>", "<|end_header_id|>"],
+    })
+    tokenizer.chat_template = CHAT_TEMPLATE
+    return tokenizer
+
+
+def build_tiny_model(tokenizer, hidden_size=64, layers=2, seed=0):
+    import torch
+    from transformers import LlamaConfig, LlamaForCausalLM
+
+    torch.manual_seed(seed)
+    config = LlamaConfig(
+        vocab_size=len(tokenizer),
+        hidden_size=hidden_size,
+        intermediate_size=hidden_size * 4,
+        num_hidden_layers=layers,
+        num_attention_heads=4,
+        num_key_value_heads=2,
+        max_position_embeddings=8192,
+        bos_token_id=tokenizer.bos_token_id,
+        eos_token_id=tokenizer.eos_token_id,
+        tie_word_embeddings=True,
+    )
+    model = LlamaForCausalLM(config).eval()
+    model.generation_config.do_sample = False
+    return model
+
+
+def tiny_loader(hidden_size, layers):
+    def load(model_id, precision):
+        tokenizer = build_tiny_tokenizer()
+        return tokenizer, build_tiny_model(tokenizer, hidden_size, layers)
+    return load
+
+
+def percentiles(values):
+    if not values:
+        return None
+    values = sorted(values)
+
+    def rank(p):
+        return round(values[min(len(values) - 1, max(0, int(round(p / 100 * len(values))) - 1))], 5)
+    return {"p50": rank(50), "p90": rank(90), "p99": rank(99), "mean": round(sum(values) / len(values), 5)}
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process; None where getrusage is unavailable (Windows)."""
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        return None
+
+
+def turn_record(streamer, submitted, first_chunk, finished):
+    times = streamer.token_times
+    return {
+        "queue_wait_s": (streamer.started_at or finished) - streamer.submitted_at,
+        "ttft_s": times[0] - streamer.submitted_at if times else None,
+        "first_chunk_s": first_chunk - submitted if first_chunk else None,
+        "inter_token_s": [b - a for a, b in zip(times, times[1:])],
+        "prompt_tokens": streamer.prompt_tokens,
+        "completion_tokens": streamer.completion_tokens,
+        "latency_s": finished - submitted,
+    }
+
+
+def run_engine_session(runtime, session, turns, args, records):
+    from chat_history import select_history
+
+    history = []
+    for text in turns:
+        message = {"role": "user", "content": text}
+        messages = select_history(history, message, args.history_tokens, runtime.token_counter)
+        submitted = time.perf_counter()
+        streamer = runtime.engine.submit(
+            messages, max_new_tokens=args.max_new_tokens, session_id=f"bench-{session}"
+        )
+        first_chunk = None
+        reply = []
+        for chunk in streamer:
+            if chunk and first_chunk is None:
+                first_chunk = time.perf_counter()
+            reply.append(chunk)
+        records.append(turn_record(streamer, submitted, first_chunk, time.perf_counter()))
+        history += [message, {"role": "assistant", "content": "".join(reply).strip()}]
+
+
+def load_app(runtime, tts_delay):
+    """Imports the Gradio app and points it at the benchmark runtime and a silent TTS."""
+    from chat_audio_cache import AudioCache
+    from chat_tts import SilentBackend, SpeechPipeline
+
+    os.environ["AMHARIC_CHAT_TTS_BACKEND"] = "silent"  # So the app does not require gTTS
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Llama-3.2-400M-Amharic-Gradio.py")
+    spec = importlib.util.spec_from_file_location("amharic_chat_app", path)
+    app = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(app)
+    app.runtime = runtime
+    app.speech = SpeechPipeline(SilentBackend(delay=tts_delay), AudioCache(tempfile.mkdtemp(prefix="bench_audio_")))
+
+    # Remember which streamer each session thread got so engine timings can be reported
+    submit = runtime.engine.submit
+    app.last_streamer = threading.local()
+
+    def recording_submit(*a, **kw):
+        streamer = submit(*a, **kw)
+        app.last_streamer.value = streamer
+        return streamer
+    runtime.engine.submit = recording_submit
+    return app
+
+
+def run_app_session(app, session, turns, args, records):
+    history = []
+    request = SimpleNamespace(session_hash=f"bench-{session}")
+    for text in turns:
+        _, history = app.user(text, history)
+        submitted = time.perf_counter()
+        first_chunk = None
+        for history, _, _ in app.bot(history, args.max_new_tokens, args.voice, request):
+            if first_chunk is None and history[-1]["content"]:
+                first_chunk = time.perf_counter()
+        records.append(turn_record(app.last_streamer.value, submitted, first_chunk, time.perf_counter()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["engine", "app"], default="engine",
+                        help="Drive the generation engine directly or the Gradio user() -> bot() handlers")
+    parser.add_argument("--sessions", type=int, default=4)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    parser.add_argument("--max-batch-size", type=int, default=8)
+    parser.add_argument("--history-tokens", type=int, default=1024)
+    parser.add_argument("--model-id", help="Benchmark this pretrained model instead of the tiny random one")
+    parser.add_argument("--precision", default="fp32")
+    parser.add_argument("--tiny-hidden-size", type=int, default=64)
+    parser.add_argument("--tiny-layers", type=int, default=2)
+    parser.add_argument("--voice", action="store_true", help="App mode: synthesize replies with the silent TTS")
+    parser.add_argument("--tts-delay", type=float, default=0.05, help="Seconds the mock TTS takes per sentence")
+    parser.add_argument("--output", help="Write the JSON report here as well as to stdout")
+    args = parser.parse_args()
+
+    from chat_prefix_cache import PrefixCache
+    from chat_runtime import ChatRuntime
+
+    loader = None if args.model_id else tiny_loader(args.tiny_hidden_size, args.tiny_layers)
+    runtime = ChatRuntime(
+        args.model_id or "tiny-random-llama", args.precision, max_batch_size=args.max_batch_size,
+        prefix_cache=PrefixCache(), loader=loader
+    ).start()
+    if not runtime.wait_ready():
+        sys.exit(f"Model failed to load: {runtime.error}")
+
+    if args.mode == "app":
+        app = load_app(runtime, args.tts_delay)
+        run_session = lambda session, turns, records: run_app_session(app, session, turns, args, records)
+    else:
+        run_session = lambda session, turns, records: run_engine_session(runtime, session, turns, args, records)
+
+    records = []
+    threads = []
+    rss_before = rss_mb()
+    start = time.perf_counter()
+    for session in range(args.sessions):
+        turns = [PROMPTS[(session + turn) % len(PROMPTS)] for turn in range(args.turns)]
+        thread = threading.Thread(target=run_session, args=(session, turns, records))
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+
+    completion_tokens = sum(r["completion_tokens"] for r in records)
+    rss_after = rss_mb()
+    peak_rss = peak_rss_mb()
+    report = {
+        "benchmark": "chat",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "config": vars(args),
+        "startup": runtime.timings,
+        "summary": {
+            "turns": len(records),
+            "wall_s": round(wall, 3),
+            "completion_tokens": completion_tokens,
+            "prompt_tokens": sum(r["prompt_tokens"] for r in records),
+            "tokens_per_s": round(completion_tokens / wall, 2) if wall else None,
+            "queue_wait_s": percentiles([r["queue_wait_s"] for r in records]),
+            "ttft_s": percentiles([r["ttft_s"] for r in records if r["ttft_s"] is not None]),
+            "first_chunk_s": percentiles([r["first_chunk_s"] for r in records if r["first_chunk_s"] is not None]),
+            "inter_token_s": percentiles([gap for r in records for gap in r["inter_token_s"]]),
+            "turn_latency_s": percentiles([r["latency_s"] for r in records]),
+            "rss_before_mb": rss_before and round(rss_before, 1),
+            "rss_after_mb": rss_after and round(rss_after, 1),
+            "peak_rss_mb": peak_rss and round(peak_rss, 1),
+        },
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
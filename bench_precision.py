@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""Compares fp32, bf16 and int8 inference of the chat model on a fixed prompt set.
+
+Each precision runs in its own subprocess so peak RSS is measured per mode. Greedy
+decoding keeps outputs comparable; drift is reported against the fp32 tokens.
+
+    python bench_precision.py --precisions fp32 bf16 int8 --max-new-tokens 64 --output precision.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_chat import peak_rss_mb
+
+MODEL_ID = "rasyosef/Llama-3.2-400M-Amharic-Instruct-Poems-Stories-Wikipedia"
+
+PROMPTS = [
+    "ሰላም፣ እንዴት ነህ?",
+    "ስለ ኢትዮጵያ የዘመን አቆጣጠር ንገረኝ?",
+    "የአባይ ወንዝ መነሻና መደረሻ የት ነው?",
+    "ለእናቴ የሚሆን አጭር የፍቅር ግጥም ጻፍልኝ?",
+    "ሰው ሰራሽ አስተውሎት (AI) ምንድን ነው?",
+    "አንድ ተረት አጫውተኝ",
+    "ዳግማዊ ምኒልክ ማን ነው?",
+    "ቢትኮይን ምንድን ነው?",
+]
+
+
+def run_precision(model_id, precision, max_new_tokens, logprobs_path):
+    """Generates every prompt with one precision and returns timings and tokens.
+
+    The first-step log-probabilities are saved to logprobs_path for the drift check.
+    """
+    import torch
+    from transformers import AutoTokenizer
+    from transformers.generation.streamers import BaseStreamer
+
+    from chat_precision import load_model
+
+    class TokenClock(BaseStreamer):
+        def __init__(self):
+            self.times = []
+            self.skipped_prompt = False
+
+        def put(self, value):
+            if not self.skipped_prompt:
+                self.skipped_prompt = True
+                return
+            self.times.append(time.perf_counter())
+
+        def end(self):
+            pass
+
+    start = time.perf_counter()
+    tokenizer = AutoTokenizer.from_pretrained(model_id)
+    model = load_model(model_id, precision)
+    load_seconds = time.perf_counter() - start
+
+    results = []
+    first_logprobs = []
+    with torch.inference_mode():
+        for prompt in PROMPTS:
+            text = tokenizer.apply_chat_template(
+                [{"role": "user", "content": prompt}], tokenize=False, add_generation_prompt=True
+            )
+            input_ids = tokenizer(text, add_special_tokens=False, return_tensors="pt").input_ids.to(model.device)
+            first_logits = model(input_ids=input_ids).logits[0, -1].float()
+
+            clock = TokenClock()
+            start = time.perf_counter()
+            output = model.generate(
+                input_ids,
+                max_new_tokens=max_new_tokens,
+                do_sample=False,
+                repetition_penalty=1.1,
+                streamer=clock,
+            )
+            end = time.perf_counter()
+            tokens = output[0, input_ids.shape[1]:].tolist()
+            results.append({
+                "prompt": prompt,
+                "tokens": tokens,
+                "ttft_s": clock.times[0] - start if clock.times else None,
+                "decode_tokens_per_s": (len(tokens) - 1) / (end - clock.times[0]) if len(tokens) > 1 else None,
+            })
+            first_logprobs.append(torch.log_softmax(first_logits, dim=-1))
+
+    torch.save(torch.stack(first_logprobs), logprobs_path)
+
+    return {"precision": precision, "load_s": load_seconds, "peak_rss_mb": peak_rss_mb(), "prompts": results}
+
+
+def drift(reference, candidate):
+    """Token agreement and first-step KL divergence of candidate against reference."""
+    import torch
+
+    ref_logprobs = torch.load(reference["logprobs_path"])
+    cand_logprobs = torch.load(candidate["logprobs_path"])
+    kl = float((ref_logprobs.exp() * (ref_logprobs - cand_logprobs)).sum(dim=-1).mean())
+
+    matched = total = prefix = 0.0
+    for ref, cand in zip(reference["prompts"], candidate["prompts"]):
+        pairs = list(zip(ref["tokens"], cand["tokens"]))
+        matched += sum(a == b for a, b in pairs)
+        total += max(len(ref["tokens"]), len(cand["tokens"]))
+        same = 0
+        for a, b in pairs:
+            if a != b:
+                break
+            same += 1
+        prefix += same
+    return {
+        "token_match_rate": matched / total if total else 1.0,
+        "mean_identical_prefix_tokens": prefix / len(reference["prompts"]),
+        "mean_first_token_kl": kl,
+    }
+
+
+def summarize(run, reference):
+    ttfts = [p["ttft_s"] for p in run["prompts"] if p["ttft_s"] is not None]
+    rates = [p["decode_tokens_per_s"] for p in run["prompts"] if p["decode_tokens_per_s"] is not None]
+    summary = {
+        "precision": run["precision"],
+        "load_s": round(run["load_s"], 3),
+        "peak_rss_mb": run["peak_rss_mb"] and round(run["peak_rss_mb"], 1),
+        "mean_ttft_s": round(sum(ttfts) / len(ttfts), 4) if ttfts else None,
+        "mean_decode_tokens_per_s": round(sum(rates) / len(rates), 2) if rates else None,
+    }
+    if reference is not None:
+        summary.update({k: round(v, 4) for k, v in drift(reference, run).items()})
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model-id", default=MODEL_ID)
+    parser.add_argument("--precisions", nargs="+", default=["fp32", "bf16", "int8"])
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    parser.add_argument("--output", help="Write the JSON report here as well as to stdout")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--logprobs-path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        json.dump(run_precision(args.model_id, args.child, args.max_new_tokens, args.logprobs_path), sys.stdout)
+        return
+
+    runs = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for precision in dict.fromkeys(["fp32"] + args.precisions):
+            print(f"Benchmarking {precision}...", file=sys.stderr)
+            logprobs_path = os.path.join(tmp_dir, f"{precision}.pt")
+            out = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--child", precision,
+                 "--model-id", args.model_id, "--max-new-tokens", str(args.max_new_tokens),
+                 "--logprobs-path", logprobs_path],
+                check=True, stdout=subprocess.PIPE, text=True
+            ).stdout
+            runs[precision] = json.loads(out)
+            runs[precision]["logprobs_path"] = logprobs_path
+
+        report = {
+            "model_id": args.model_id,
+            "max_new_tokens": args.max_new_tokens,
+            "results": [summarize(runs[p], None if p == "fp32" else runs["fp32"]) for p in runs if p in args.precisions],
+        }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
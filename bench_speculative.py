@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""Measures prompt-lookup speculative decoding against plain decoding on the example prompts.
+
+Both engines share one loaded model and decode greedily, so their outputs should be
+identical; the report gives the draft acceptance rate, tokens per forward pass and
+the end-to-end speedup per prompt.
+
+    python bench_speculative.py --draft-tokens 8 --max-new-tokens 128 --output speculative.json
+    python bench_speculative.py --tiny     # offline smoke run on a tiny random model
+"""
+import argparse
+import json
+import sys
+import time
+
+from chat_examples import EXAMPLE_PROMPTS
+
+MODEL_ID = "rasyosef/Llama-3.2-400M-Amharic-Instruct-Poems-Stories-Wikipedia"
+FOLLOW_UP = "ተጨማሪ ንገረኝ"
+
+
+def converse(engine, prompt, turns, max_new_tokens):
+    """Runs one conversation and returns (seconds, completion tokens, replies)."""
+    history = []
+    seconds = 0.0
+    tokens = 0
+    replies = []
+    for turn in range(turns):
+        history.append({"role": "user", "content": prompt if turn == 0 else FOLLOW_UP})
+        start = time.perf_counter()
+        streamer = engine.submit(history, max_new_tokens=max_new_tokens, do_sample=False)
+        reply = "".join(streamer)
+        seconds += time.perf_counter() - start
+        tokens += streamer.completion_tokens
+        replies.append(reply)
+        history.append({"role": "assistant", "content": reply.strip()})
+    return seconds, tokens, replies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model-id", default=MODEL_ID)
+    parser.add_argument("--precision", default="fp32")
+    parser.add_argument("--tiny", action="store_true", help="Use the tiny random model from bench_chat.py")
+    parser.add_argument("--draft-tokens", type=int, default=8)
+    parser.add_argument("--max-ngram", type=int, default=3)
+    parser.add_argument("--max-new-tokens", type=int, default=128)
+    parser.add_argument("--turns", type=int, default=2, help="Turns per conversation; later turns ask for more")
+    parser.add_argument("--output", help="Write the JSON report here as well as to stdout")
+    args = parser.parse_args()
+
+    from chat_engine import GenerationEngine
+    from chat_runtime import ChatRuntime
+    from chat_speculative import PromptLookupDrafter
+
+    loader = None
+    if args.tiny:
+        from bench_chat import tiny_loader
+        loader = tiny_loader(64, 2)
+    runtime = ChatRuntime(args.model_id, args.precision, max_batch_size=1, loader=loader).start()
+    if not runtime.wait_ready():
+        sys.exit(f"Model failed to load: {runtime.error}")
+
+    baseline = runtime.engine
+    speculative = GenerationEngine(
+        runtime.model, runtime.tokenizer, max_batch_size=1,
+        drafter=PromptLookupDrafter(num_draft_tokens=args.draft_tokens, max_ngram=args.max_ngram)
+    ).start()
+
+    results = []
+    for prompt in EXAMPLE_PROMPTS:
+        base_s, base_tokens, base_replies = converse(baseline, prompt, args.turns, args.max_new_tokens)
+        steps, drafted, accepted = speculative.draft_steps, speculative.drafted_tokens, speculative.accepted_tokens
+        spec_s, spec_tokens, spec_replies = converse(speculative, prompt, args.turns, args.max_new_tokens)
+        steps = speculative.draft_steps - steps
+        drafted, accepted = speculative.drafted_tokens - drafted, speculative.accepted_tokens - accepted
+        results.append({
+            "prompt": prompt,
+            "tokens": spec_tokens,
+            "baseline_tokens_per_s": round(base_tokens / base_s, 2),
+            "speculative_tokens_per_s": round(spec_tokens / spec_s, 2),
+            "speedup": round(base_s / spec_s, 3),
+            "draft_steps": steps,
+            "drafted": drafted,
+            "accepted": accepted,
+            "acceptance_rate": round(accepted / drafted, 3) if drafted else None,
+            "outputs_match": base_replies == spec_replies,
+        })
+        print(f"{prompt}: speedup {results[-1]['speedup']}x, acceptance {results[-1]['acceptance_rate']}", file=sys.stderr)
+
+    steps = sum(r["draft_steps"] for r in results)
+    drafted = sum(r["drafted"] for r in results)
+    accepted = sum(r["accepted"] for r in results)
+    report = {
+        "model_id": "tiny-random-llama" if args.tiny else args.model_id,
+        "config": vars(args),
+        "summary": {
+            "mean_speedup": round(sum(r["speedup"] for r in results) / len(results), 3),
+            "acceptance_rate": round(accepted / drafted, 3) if drafted else None,
+            "tokens_per_verify_pass": round((accepted + steps) / steps, 3) if steps else None,
+            "outputs_match": sum(r["outputs_match"] for r in results),
+            "prompts": len(results),
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
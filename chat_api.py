@@ -0,0 +1,174 @@
+import asyncio
+import json
+import threading
+import time
+import uuid
+
+from chat_examples import REPETITION_PENALTY
+
+MAX_NEW_TOKENS = 1024
+DISCONNECT_POLL_S = 0.5  # How often a non-streaming request checks that its client is still there
+
+
+class RequestSlots:
+    """Caps the number of API requests in flight; extra ones are turned away, not queued."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_flight = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            if self.in_flight >= self.limit:
+                self.rejected += 1
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+
+
+def _error(status, message, kind, headers=None):
+    from fastapi.responses import JSONResponse
+    return JSONResponse({"error": {"message": message, "type": kind}}, status_code=status, headers=headers)
+
+
+def _message_text(content):
+    """Message content as plain text; OpenAI content-part arrays are joined from their text parts."""
+    if content is None or isinstance(content, str):
+        return content or ""
+    if isinstance(content, list) and all(isinstance(part, dict) for part in content):
+        if any(part.get("type") != "text" or not isinstance(part.get("text"), str) for part in content):
+            raise ValueError("Only text content parts are supported")
+        return "\n".join(part["text"] for part in content)
+    raise ValueError("Message 'content' must be a string or a list of text parts")
+
+
+def parse_request(body):
+    """Messages, max_tokens and repetition_penalty of a chat request; ValueError says what is wrong."""
+    if not isinstance(body, dict):
+        raise ValueError("Request body must be a JSON object")
+    messages = body.get("messages")
+    if not isinstance(messages, list) or not messages:
+        raise ValueError("'messages' must be a non-empty list")
+    if not all(isinstance(m, dict) and isinstance(m.get("role"), str) for m in messages):
+        raise ValueError("Each message must be an object with a string 'role'")
+    messages = [{"role": m["role"], "content": _message_text(m.get("content"))} for m in messages]
+    try:
+        max_tokens = int(body.get("max_completion_tokens") or body.get("max_tokens") or 256)
+        repetition_penalty = float(body.get("repetition_penalty", REPETITION_PENALTY))
+    except (TypeError, ValueError):
+        raise ValueError("'max_tokens' and 'repetition_penalty' must be numbers") from None
+    if not repetition_penalty > 0:
+        raise ValueError("'repetition_penalty' must be positive")
+    return messages, max(1, min(max_tokens, MAX_NEW_TOKENS)), repetition_penalty
+
+
+def add_openai_routes(app, runtime, model_name, max_in_flight=32, metrics=None):
+    """Adds an OpenAI-compatible /v1/chat/completions endpoint backed by the shared engine.
+
+    Requests beyond the engine's batch wait in its queue; beyond max_in_flight they
+    get a 429 with Retry-After so callers back off instead of piling up.
+    """
+    from fastapi import Request
+    from fastapi.responses import StreamingResponse
+    from starlette.concurrency import run_in_threadpool
+
+    slots = RequestSlots(max_in_flight)
+    app.state.openai_slots = slots
+    if metrics:
+        metrics.gauge("api_in_flight", "API requests in flight", lambda: slots.in_flight)
+        metrics.gauge("api_rejected_total", "API requests turned away with 429", lambda: slots.rejected, "counter")
+
+    @app.get("/v1/models")
+    def models():
+        return {"object": "list", "data": [{"id": model_name, "object": "model", "owned_by": "local"}]}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        try:
+            body = await request.json()
+        except ValueError:
+            return _error(400, "Request body must be JSON", "invalid_request_error")
+        try:
+            messages, max_tokens, repetition_penalty = parse_request(body)
+        except ValueError as e:
+            return _error(400, str(e), "invalid_request_error")
+
+        if not runtime.ready:
+            return _error(503, f"Model is {runtime.status}", "server_error", {"Retry-After": "5"})
+        if not slots.acquire():
+            return _error(429, "Too many requests in flight", "rate_limit_error", {"Retry-After": "1"})
+
+        try:
+            streamer = runtime.engine.submit(messages, max_new_tokens=max_tokens, repetition_penalty=repetition_penalty)
+        except Exception:
+            slots.release()
+            raise
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        start = time.perf_counter()
+
+        if not body.get("stream"):
+            collect = asyncio.ensure_future(run_in_threadpool("".join, streamer))
+            try:
+                # Nobody reads the reply once the client is gone, so stop decoding it
+                while not collect.done():
+                    await asyncio.wait({collect}, timeout=DISCONNECT_POLL_S)
+                    if not collect.done() and await request.is_disconnected():
+                        streamer.cancel("disconnected")
+                text = await collect
+            finally:
+                slots.release()
+            if metrics:
+                metrics.observe_generation(streamer, "api", time.perf_counter() - start)
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model_name,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": text.strip()},
+                    "finish_reason": streamer.finish_reason,
+                }],
+                "usage": {
+                    "prompt_tokens": streamer.prompt_tokens,
+                    "completion_tokens": streamer.completion_tokens,
+                    "total_tokens": streamer.prompt_tokens + streamer.completion_tokens,
+                },
+            }
+
+        def chunk(delta, finish_reason=None):
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model_name,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+        # Starlette iterates this sync generator in its threadpool and closes it on disconnect
+        def events():
+            first_chunk_s = None
+            try:
+                yield chunk({"role": "assistant", "content": ""})
+                for text in streamer:
+                    if text:
+                        first_chunk_s = first_chunk_s or time.perf_counter() - start
+                        yield chunk({"content": text})
+                yield chunk({}, streamer.finish_reason)
+                yield "data: [DONE]\n\n"
+                if metrics:
+                    metrics.observe_generation(streamer, "api", first_chunk_s)
+            finally:
+                # A no-op when finished; otherwise the client disconnected, so stop decoding for it
+                streamer.cancel("disconnected")
+                slots.release()
+
+        return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
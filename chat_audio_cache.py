@@ -0,0 +1,95 @@
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+class AudioCache:
+    """Content-addressed store of synthesized audio with an LRU size cap.
+
+    Files are named by a hash of (text, language, voice), so identical sentences are
+    synthesized once and served from disk afterwards. Writes go to a temporary file
+    that is renamed into place, so a reader never sees a half-written file.
+    """
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._index = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    @staticmethod
+    def key(text, lang, voice):
+        return hashlib.sha256(f"{lang}\0{voice}\0{text}".encode("utf-8")).hexdigest()
+
+    def _load(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            name, ext = os.path.splitext(entry.name)
+            if entry.is_file() and len(name) == 64 and not name.startswith("."):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, name + ext, stat.st_size))
+        for _, file_name, size in sorted(entries):
+            self._index[file_name] = size
+            self.total_bytes += size
+        self._evict()
+
+    def get_or_create(self, text, backend):
+        """Returns the audio path for text, synthesizing it only on a cache miss."""
+        file_name = self.key(text, backend.lang, backend.voice) + backend.suffix
+        path = os.path.join(self.directory, file_name)
+        with self._lock:
+            key_lock = self._key_locks.setdefault(file_name, [threading.Lock(), 0])
+            key_lock[1] += 1
+
+        # Concurrent requests for the same text wait for the first synthesis
+        try:
+            with key_lock[0]:
+                with self._lock:
+                    if file_name in self._index and os.path.exists(path):
+                        self._index.move_to_end(file_name)
+                        self.hits += 1
+                        os.utime(path)
+                        return path
+                    self.misses += 1
+
+                fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".", suffix=backend.suffix)
+                os.close(fd)
+                try:
+                    backend.synthesize(text, tmp_path)
+                    os.replace(tmp_path, path)
+                except BaseException:
+                    os.remove(tmp_path)
+                    raise
+                size = os.path.getsize(path)
+                with self._lock:
+                    self.total_bytes += size - self._index.pop(file_name, 0)
+                    self._index[file_name] = size
+                    self._evict(keep=file_name)
+                return path
+        finally:
+            with self._lock:
+                key_lock[1] -= 1
+                if not key_lock[1]:
+                    self._key_locks.pop(file_name, None)
+
+    def _evict(self, keep=None):
+        while self.total_bytes > self.max_bytes and len(self._index) > (1 if keep else 0):
+            file_name, size = next(iter(self._index.items()))
+            if file_name == keep:
+                break
+            del self._index[file_name]
+            self.total_bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(os.path.join(self.directory, file_name))
+            except OSError:
+                pass
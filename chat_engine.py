@@ -0,0 +1,425 @@
+import queue
+import threading
+import time
+
+import torch
+import torch.nn.functional as F
+from transformers import TextIteratorStreamer
+from transformers.generation import (
+    LogitsProcessorList,
+    RepetitionPenaltyLogitsProcessor,
+    StoppingCriteria,
+    TemperatureLogitsWarper,
+    TopKLogitsWarper,
+    TopPLogitsWarper,
+)
+
+
+def to_legacy_cache(cache):
+    """Returns past_key_values as a tuple of (key, value) tensors per layer."""
+    if cache is None or isinstance(cache, (tuple, list)):
+        return cache
+    if hasattr(cache, "to_legacy_cache"):
+        return cache.to_legacy_cache()
+    return tuple((layer.keys, layer.values) for layer in cache.layers)
+
+
+def from_legacy_cache(legacy):
+    """Wraps per-layer (key, value) tensors in whatever cache type the model expects."""
+    try:
+        from transformers import DynamicCache
+    except ImportError:
+        return tuple(tuple(kv) for kv in legacy)
+    if hasattr(DynamicCache, "from_legacy_cache"):
+        return DynamicCache.from_legacy_cache(tuple(tuple(kv) for kv in legacy))
+    cache = DynamicCache()
+    for layer_idx, (key, value) in enumerate(legacy):
+        cache.update(key, value, layer_idx)
+    return cache
+
+
+def _left_pad(tensor, width, dim):
+    missing = width - tensor.shape[dim]
+    if missing <= 0:
+        return tensor
+    pad = [0, 0] * (tensor.dim() - dim - 1) + [missing, 0]
+    return F.pad(tensor, pad)
+
+
+class CancellationToken(StoppingCriteria):
+    """Set from any thread to stop a generation at its next decode step.
+
+    The engine checks it between steps; as a StoppingCriteria it also stops a
+    plain model.generate() call.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self.reason = None
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self, reason="cancelled"):
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return torch.full((input_ids.shape[0],), self.cancelled, dtype=torch.bool, device=input_ids.device)
+
+
+class GenerationStreamer(TextIteratorStreamer):
+    """TextIteratorStreamer that also reports token counts, timings and why generation ended."""
+
+    def __init__(self, tokenizer):
+        super().__init__(tokenizer, skip_prompt=True, skip_special_tokens=True)
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.finish_reason = None
+        self.submitted_at = time.perf_counter()
+        self.started_at = None
+        self.prefill_s = None
+        self.token_times = []
+        self.cancellation = CancellationToken()
+
+    def cancel(self, reason="cancelled"):
+        """Asks the engine to stop this generation; a no-op once it has finished."""
+        if self.finish_reason is None:
+            self.cancellation.cancel(reason)
+
+
+class GenerationRequest:
+    """One chat completion travelling through the engine."""
+
+    def __init__(self, messages, max_new_tokens, repetition_penalty, streamer, do_sample=None, session_id=None):
+        self.messages = messages
+        self.session_id = session_id
+        self.max_new_tokens = int(max_new_tokens)
+        self.repetition_penalty = repetition_penalty
+        self.do_sample = do_sample
+        self.streamer = streamer
+
+
+class _Sequence:
+    def __init__(self, request, prompt_ids, processors, do_sample):
+        self.request = request
+        self.token_ids = list(prompt_ids)
+        self.processors = processors
+        self.do_sample = do_sample
+        self.generated = 0
+
+
+class GenerationEngine:
+    """Single thread that owns the model and decodes every active request in one batch.
+
+    New requests are prefilled on their own and then join the running batch at the
+    next decode step; finished sequences leave it straight away. The batched KV cache
+    is left-padded, so each row carries its own attention mask and position ids.
+    With a prefix_cache, a session's next turn only prefills what its last turn
+    did not already cover. With a drafter, a lone sequence decodes speculatively:
+    drafted tokens are verified in one forward pass and the cache is cropped back
+    to what was accepted. Batches of two or more decode normally, since batching
+    already spreads the cost of reading the weights. A request whose streamer is
+    cancelled leaves the batch before the next step.
+    """
+
+    def __init__(self, model, tokenizer, max_batch_size=8, prefix_cache=None, drafter=None):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_batch_size = max_batch_size
+        self.prefix_cache = prefix_cache
+        self.drafter = drafter
+        self.draft_steps = 0
+        self.drafted_tokens = 0
+        self.accepted_tokens = 0
+        self.cancelled_requests = 0
+        self.saved_tokens = 0
+        self.device = model.device
+        self._pending = queue.Queue()
+        self._active = []
+        self._cache = None
+        self._mask = None
+        self._thread = None
+
+        generation_config = model.generation_config
+        eos = generation_config.eos_token_id
+        eos = [] if eos is None else ([eos] if isinstance(eos, int) else list(eos))
+        if tokenizer.eos_token_id is not None:
+            eos.append(tokenizer.eos_token_id)
+        self.eos_token_ids = set(eos)
+
+    @property
+    def pending(self):
+        return self._pending.qsize()
+
+    @property
+    def active(self):
+        return len(self._active)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="generation-engine", daemon=True)
+            self._thread.start()
+        return self
+
+    def submit(self, messages, max_new_tokens=256, repetition_penalty=1.1, do_sample=None, session_id=None):
+        """Queues a chat for generation and returns a streamer yielding its text."""
+        streamer = GenerationStreamer(self.tokenizer)
+        self._pending.put(GenerationRequest(
+            messages, max_new_tokens, repetition_penalty, streamer, do_sample, session_id
+        ))
+        return streamer
+
+    def _run(self):
+        with torch.inference_mode():
+            while True:
+                try:
+                    self._admit(block=not self._active)
+                    self._drop_cancelled()
+                    if self._active:
+                        self._decode_step()
+                except Exception as e:
+                    print(f"Generation Error: {e}")
+                    for seq in self._active:
+                        seq.request.streamer.finish_reason = "error"
+                        seq.request.streamer.end()
+                    self._active, self._cache, self._mask = [], None, None
+
+    def _admit(self, block):
+        while len(self._active) < self.max_batch_size:
+            try:
+                request = self._pending.get(block=block)
+            except queue.Empty:
+                return
+            block = False
+            if request.streamer.cancellation.cancelled:
+                self._cancel(request)
+                continue
+            try:
+                self._prefill(request)
+            except Exception as e:
+                print(f"Generation Error: {e}")
+                request.streamer.finish_reason = "error"
+                request.streamer.end()
+
+    def _encode(self, messages):
+        text = self.tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+        return self.tokenizer(text, add_special_tokens=False)["input_ids"]
+
+    def _processors(self, request):
+        config = self.model.generation_config
+        do_sample = config.do_sample if request.do_sample is None else request.do_sample
+        processors = LogitsProcessorList()
+        if request.repetition_penalty and request.repetition_penalty != 1.0:
+            processors.append(RepetitionPenaltyLogitsProcessor(penalty=request.repetition_penalty))
+        if do_sample:
+            if config.temperature is not None and config.temperature != 1.0:
+                processors.append(TemperatureLogitsWarper(config.temperature))
+            if config.top_k:
+                processors.append(TopKLogitsWarper(top_k=config.top_k))
+            if config.top_p is not None and config.top_p < 1.0:
+                processors.append(TopPLogitsWarper(top_p=config.top_p))
+        return processors, do_sample
+
+    def _prefill(self, request):
+        request.streamer.started_at = time.perf_counter()
+        prompt_ids = self._encode(request.messages)
+        request.streamer.prompt_tokens = len(prompt_ids)
+        request.streamer.put(torch.tensor(prompt_ids))
+        processors, do_sample = self._processors(request)
+        seq = _Sequence(request, prompt_ids, processors, do_sample)
+
+        cached, n = None, 0
+        if self.prefix_cache is not None and request.session_id is not None:
+            cached, n = self.prefix_cache.lookup(request.session_id, prompt_ids)
+
+        input_ids = torch.tensor([prompt_ids[n:]], device=self.device)
+        if cached is None:
+            out = self.model(input_ids=input_ids, use_cache=True)
+        else:
+            out = self.model(
+                input_ids=input_ids,
+                position_ids=torch.arange(n, len(prompt_ids), device=self.device).unsqueeze(0),
+                past_key_values=from_legacy_cache(cached),
+                use_cache=True,
+            )
+        legacy = to_legacy_cache(out.past_key_values)
+        request.streamer.prefill_s = time.perf_counter() - request.streamer.started_at
+        if self._emit(seq, out.logits[0, -1, :]):
+            self._remember(seq, legacy)
+            return
+        self._join(seq, legacy)
+
+    def _join(self, seq, legacy):
+        new_len = legacy[0][0].shape[2]
+        new_mask = torch.ones((1, new_len), dtype=torch.long, device=self.device)
+        if not self._active:
+            self._cache = [list(kv) for kv in legacy]
+            self._mask = new_mask
+        else:
+            width = max(self._mask.shape[1], new_len)
+            self._cache = [
+                [torch.cat([_left_pad(cur, width, 2), _left_pad(new, width, 2)], dim=0)
+                 for cur, new in zip(cur_layer, new_layer)]
+                for cur_layer, new_layer in zip(self._cache, legacy)
+            ]
+            self._mask = torch.cat([_left_pad(self._mask, width, 1), _left_pad(new_mask, width, 1)], dim=0)
+        self._active.append(seq)
+
+    def _decode_step(self):
+        if self.drafter is not None and len(self._active) == 1:
+            seq = self._active[0]
+            if self._mask.shape[1] == len(seq.token_ids) - 1:
+                draft = self.drafter.propose(seq.token_ids, seq.request.max_new_tokens - seq.generated)
+                if draft:
+                    return self._speculative_step(seq, draft)
+
+        input_ids = torch.tensor([[seq.token_ids[-1]] for seq in self._active], device=self.device)
+        position_ids = torch.tensor([[len(seq.token_ids) - 1] for seq in self._active], device=self.device)
+        mask = torch.cat([self._mask, self._mask.new_ones((len(self._active), 1))], dim=1)
+        out = self.model(
+            input_ids=input_ids,
+            attention_mask=mask,
+            position_ids=position_ids,
+            past_key_values=from_legacy_cache(self._cache),
+            use_cache=True,
+        )
+        self._cache = [list(kv) for kv in to_legacy_cache(out.past_key_values)]
+        self._mask = mask
+
+        finished = [row for row, seq in enumerate(self._active) if self._emit(seq, out.logits[row, -1, :])]
+        if finished:
+            self._leave(finished)
+
+    def _speculative_step(self, seq, draft):
+        """Feeds the last token plus the draft, keeps the verified prefix and one model token."""
+        start = len(seq.token_ids) - 1
+        input_ids = torch.tensor([seq.token_ids[-1:] + draft], device=self.device)
+        position_ids = torch.arange(start, start + len(draft) + 1, device=self.device).unsqueeze(0)
+        mask = torch.cat([self._mask, self._mask.new_ones((1, len(draft) + 1))], dim=1)
+        out = self.model(
+            input_ids=input_ids,
+            attention_mask=mask,
+            position_ids=position_ids,
+            past_key_values=from_legacy_cache(self._cache),
+            use_cache=True,
+        )
+        legacy = to_legacy_cache(out.past_key_values)
+
+        accepted = 0
+        finished = False
+        for i, logits in enumerate(out.logits[0]):
+            scores = self._scores(seq, logits)
+            if i < len(draft):
+                if self._verify(seq, scores, draft[i]):
+                    accepted += 1
+                    finished = self._accept(seq, draft[i])
+                    if finished:
+                        break
+                    continue
+                token = self._resample(seq, scores, draft[i])
+            else:
+                token = self._pick(seq, scores)
+            finished = self._accept(seq, token)
+            break
+        self.draft_steps += 1
+        self.drafted_tokens += len(draft)
+        self.accepted_tokens += accepted
+
+        # The cache keeps every token but the newest, which is fed on the next step
+        keep = len(seq.token_ids) - 1
+        self._cache = [[t[:, :, :keep] for t in layer] for layer in legacy]
+        self._mask = mask[:, :keep]
+        if finished:
+            self._leave([0])
+
+    def _scores(self, seq, logits):
+        return seq.processors(torch.tensor([seq.token_ids], device=logits.device), logits.float().unsqueeze(0))
+
+    def _pick(self, seq, scores):
+        if seq.do_sample:
+            return int(torch.multinomial(torch.softmax(scores, dim=-1), num_samples=1)[0, 0])
+        return int(scores[0].argmax())
+
+    def _verify(self, seq, scores, token):
+        """Accepts a drafted token as greedy decoding or speculative sampling would."""
+        if not seq.do_sample:
+            return int(scores[0].argmax()) == token
+        # The draft is a point mass, so it is kept with the target probability of that token
+        return float(torch.rand(())) < float(torch.softmax(scores, dim=-1)[0, token])
+
+    def _resample(self, seq, scores, rejected):
+        if not seq.do_sample:
+            return int(scores[0].argmax())
+        probs = torch.softmax(scores, dim=-1)[0]
+        probs[rejected] = 0
+        if float(probs.sum()) <= 0:
+            return int(scores[0].argmax())
+        return int(torch.multinomial(probs / probs.sum(), num_samples=1)[0])
+
+    def _emit(self, seq, logits):
+        """Samples the next token for a sequence; returns True when it is finished."""
+        return self._accept(seq, self._pick(seq, self._scores(seq, logits)))
+
+    def _accept(self, seq, token):
+        """Appends a token and streams it; returns True when the sequence is finished."""
+        seq.token_ids.append(token)
+        seq.generated += 1
+        streamer = seq.request.streamer
+        streamer.completion_tokens = seq.generated
+        streamer.token_times.append(time.perf_counter())
+
+        if token in self.eos_token_ids:
+            streamer.finish_reason = "stop"
+            streamer.end()
+            return True
+        streamer.put(torch.tensor([token]))
+        if seq.generated >= seq.request.max_new_tokens:
+            streamer.finish_reason = "length"
+            streamer.end()
+            return True
+        return False
+
+    def _cancel(self, request, generated=0):
+        self.cancelled_requests += 1
+        self.saved_tokens += max(0, request.max_new_tokens - generated)
+        request.streamer.finish_reason = "cancelled"
+        request.streamer.end()
+
+    def _drop_cancelled(self):
+        rows = [row for row, seq in enumerate(self._active) if seq.request.streamer.cancellation.cancelled]
+        for row in rows:
+            seq = self._active[row]
+            self._cancel(seq.request, seq.generated)
+        if rows:
+            self._leave(rows)
+
+    def _remember(self, seq, legacy):
+        """Hands a finished sequence's cache (all but its last token) to the prefix cache."""
+        if self.prefix_cache is None or seq.request.session_id is None:
+            return
+        self.prefix_cache.store(seq.request.session_id, seq.token_ids[:-1], legacy)
+
+    def _leave(self, rows):
+        rows = set(rows)
+        if self.prefix_cache is not None:
+            for row in rows:
+                seq = self._active[row]
+                if seq.request.session_id is None:
+                    continue
+                start = int(self._mask[row].nonzero()[0])
+                self._remember(seq, tuple(
+                    tuple(t[row:row + 1, :, start:].clone() for t in layer) for layer in self._cache
+                ))
+        keep = [row for row in range(len(self._active)) if row not in rows]
+        self._active = [self._active[row] for row in keep]
+        if not self._active:
+            self._cache, self._mask = None, None
+            return
+        index = torch.tensor(keep, device=self.device)
+        mask = self._mask.index_select(0, index)
+        start = int((mask.sum(dim=0) > 0).nonzero()[0])
+        self._mask = mask[:, start:]
+        self._cache = [[t.index_select(0, index)[:, :, start:] for t in layer] for layer in self._cache]
@@ -0,0 +1,166 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+
+# Quick-start prompts shown under the chat box; also used by the benchmarks
+EXAMPLE_PROMPTS = [
+    "ሰላም",
+    "ሰላም፣ እንዴት ነህ?",
+    "አንተ ማንህ?",
+    "ስለ ኢትዮጵያ የዘመን አቆጣጠር ንገረኝ?",
+    "የአባይ ወንዝ መነሻና መደረሻ የት ነው?",
+    "ስለ አቡሸከር (የዘመን ስሌት) ምን ይታወቃል?",
+    "ለእናቴ የሚሆን አጭር የፍቅር ግጥም ጻፍልኝ?",
+    "ሰው ሰራሽ አስተውሎት (AI) ምንድን ነው?",
+    "ስለ አክሱም ሥልጣን ታሪካዊ ውይይታ አብራራልኝ?",
+    "ጥሩ የጤና አጠባበቅ ምክሮችን ንገረኝ?",
+    "አጭርና አስቂኝ ቀልድ ንገረኝ?",
+    "ግጥም ጻፍልኝ",
+    "ስለ ይቅርታ ግጥም ጻፍልኝ",
+    "አንድ ተረት አጫውተኝ",
+    "ስለ ጽጉብና አንበሳ ተረት ንገረኝ",
+    "ቀልድ ንገረኝ",
+    "ስለ ስራ አጥነት አንድ ቀልድ ንገረኝ",
+    "ዳግማዊ ቴዎድሮስ ማን ነው?",
+    "ዳግማዊ ምኒልክ ማን ነው?",
+    "ስለ አዲስ አበባ ዩኒቨርስቲ ጥቂት እውነታዎችን አጫውተኝ",
+    "ስለ ጃፓን ጥቂት እውነታዎችን ንገረኝ",
+    "ስለ ማይክሮሶፍት ጥቂት እውነታዎችን ንገረኝ",
+    "ጉጉል ምንድን ነው?",
+    "ቢትኮይን ምንድን ነው?",
+]
+
+CACHE_VERSION = 1
+INDEX_NAME = "examples.json"
+# Shared with the chat UI, so a change to it also invalidates the cached replies
+REPETITION_PENALTY = 1.1
+# Generation settings the cached replies are produced with; greedy so a rebuild is reproducible
+EXAMPLE_SETTINGS = {"max_new_tokens": 256, "repetition_penalty": REPETITION_PENALTY, "do_sample": False}
+
+
+class ExampleCache:
+    """Replies and audio for EXAMPLE_PROMPTS, generated once and served without the model.
+
+    The cache lives in a directory named by a hash of the cache version, model id,
+    precision, generation settings and TTS voice, so changing any of them starts a
+    new cache instead of serving stale replies.
+    """
+
+    def __init__(self, root, model_id, precision="fp32", backend=None, settings=EXAMPLE_SETTINGS):
+        self.model_id = model_id
+        self.backend = backend
+        self.settings = dict(settings)
+        self.hits = 0
+        description = {
+            "version": CACHE_VERSION,
+            "model_id": model_id,
+            "precision": precision,
+            "settings": self.settings,
+            "tts": [backend.lang, backend.voice] if backend else None,
+        }
+        self.key = hashlib.sha256(json.dumps(description, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+        self.root = root
+        self.directory = os.path.join(root, self.key)
+        self.index_path = os.path.join(self.directory, INDEX_NAME)
+        self.entries = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path, encoding="utf-8") as f:
+                self.entries = json.load(f)["entries"]
+
+    @property
+    def complete(self):
+        return all(prompt in self.entries for prompt in EXAMPLE_PROMPTS)
+
+    def lookup(self, previous_messages, user_message, max_new_tokens):
+        """Returns the cached entry for a first-turn example prompt, or None.
+
+        A reply that ended on its own is valid for any token limit at least as long;
+        one cut off at the limit only for the same limit.
+        """
+        if previous_messages:
+            return None
+        entry = self.entries.get(user_message)
+        if entry is None:
+            return None
+        if entry["finish_reason"] == "length":
+            if int(max_new_tokens) != self.settings["max_new_tokens"]:
+                return None
+        elif int(max_new_tokens) < entry["completion_tokens"]:
+            return None
+        self.hits += 1
+        return entry
+
+    def audio_paths(self, entry):
+        return [os.path.join(self.directory, name) for name in entry.get("audio", [])]
+
+    def build(self, engine):
+        """Generates every missing example, saving after each so an interrupted build resumes."""
+        from chat_tts import SentenceSplitter
+
+        os.makedirs(self.directory, exist_ok=True)
+        for name in os.listdir(self.root):
+            if name != self.key and self._is_cache_dir(os.path.join(self.root, name)):
+                shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+
+        for number, prompt in enumerate(EXAMPLE_PROMPTS):
+            if prompt in self.entries:
+                continue
+            streamer = engine.submit([{"role": "user", "content": prompt}], **self.settings)
+            reply = "".join(streamer).strip()
+            entry = {
+                "reply": reply,
+                "completion_tokens": streamer.completion_tokens,
+                "finish_reason": streamer.finish_reason,
+                "audio": [],
+            }
+            if self.backend and reply:
+                splitter = SentenceSplitter()
+                for i, sentence in enumerate(splitter.feed(reply) + splitter.flush()):
+                    name = f"{number:02d}_{i:02d}{self.backend.suffix}"
+                    tmp_path = os.path.join(self.directory, "." + name)
+                    self.backend.synthesize(sentence, tmp_path)
+                    os.replace(tmp_path, os.path.join(self.directory, name))
+                    entry["audio"].append(name)
+            self.entries[prompt] = entry
+            self._save()
+            print(f"Cached example {number + 1}/{len(EXAMPLE_PROMPTS)}: {prompt}")
+
+    @staticmethod
+    def _is_cache_dir(path):
+        """Only stale caches this class created are removed, never other folders under root."""
+        name = os.path.basename(path)
+        return (len(name) == 16 and all(c in "0123456789abcdef" for c in name)
+                and os.path.isfile(os.path.join(path, INDEX_NAME)))
+
+    def _save(self):
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"model_id": self.model_id, "settings": self.settings, "entries": self.entries},
+                      f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.index_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-generate replies and audio for the example prompts")
+    parser.add_argument("--model-id", default="rasyosef/Llama-3.2-400M-Amharic-Instruct-Poems-Stories-Wikipedia")
+    parser.add_argument("--precision", default=os.environ.get("AMHARIC_CHAT_PRECISION", "fp32"))
+    parser.add_argument("--tts-backend", default=os.environ.get("AMHARIC_CHAT_TTS_BACKEND", "gtts"))
+    parser.add_argument("--cache-dir", default=os.environ.get("AMHARIC_CHAT_EXAMPLE_CACHE_DIR", "./example_cache"))
+    args = parser.parse_args()
+
+    from chat_runtime import ChatRuntime
+    from chat_tts import make_backend
+
+    runtime = ChatRuntime(args.model_id, args.precision, warmup=False).start()
+    if not runtime.wait_ready():
+        sys.exit(f"Model failed to load: {runtime.error}")
+    cache = ExampleCache(args.cache_dir, args.model_id, args.precision, make_backend(args.tts_backend))
+    cache.build(runtime.engine)
+    print(f"Example cache ready: {os.path.abspath(cache.directory)}")
+
+
+if __name__ == "__main__":
+    main()
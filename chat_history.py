@@ -0,0 +1,59 @@
+import threading
+from collections import OrderedDict
+
+
+class TokenCounter:
+    """Token counts per chat message, cached so each turn only tokenizes new messages."""
+
+    def __init__(self, tokenizer, max_entries=4096):
+        self.tokenizer = tokenizer
+        self.max_entries = max_entries
+        self._counts = OrderedDict()
+        self._lock = threading.Lock()
+        self.overhead = self._template_overhead()
+
+    def _template_overhead(self):
+        """Tokens the chat template adds around each message (role header, end of turn)."""
+        try:
+            one = [{"role": "user", "content": "x"}]
+            two = one + [{"role": "assistant", "content": "x"}]
+            encode = lambda messages: self.tokenizer.apply_chat_template(messages, tokenize=False)
+            extra = self.tokenizer(encode(two), add_special_tokens=False)["input_ids"]
+            base = self.tokenizer(encode(one), add_special_tokens=False)["input_ids"]
+            return max(0, len(extra) - len(base) - len(self.tokenizer("x", add_special_tokens=False)["input_ids"]))
+        except Exception:
+            return 4
+
+    def count(self, message):
+        key = (message["role"], message["content"])
+        with self._lock:
+            if key in self._counts:
+                self._counts.move_to_end(key)
+                return self._counts[key]
+        n = len(self.tokenizer(message["content"], add_special_tokens=False)["input_ids"]) + self.overhead
+        with self._lock:
+            self._counts[key] = n
+            while len(self._counts) > self.max_entries:
+                self._counts.popitem(last=False)
+        return n
+
+
+def select_history(history, user_message, budget, counter):
+    """Keeps the newest whole turns whose tokens, with the new message, fit the budget.
+
+    The oldest turns are dropped first; a user message is never kept without the
+    assistant reply that followed it, nor the other way round.
+    """
+    remaining = budget - counter.count(user_message)
+    selected = []
+    i = len(history)
+    while i > 0:
+        start = i - 2 if i >= 2 and history[i - 2]["role"] == "user" else i - 1
+        turn = history[start:i]
+        cost = sum(counter.count(msg) for msg in turn)
+        if cost > remaining:
+            break
+        remaining -= cost
+        selected[:0] = turn
+        i = start
+    return selected + [user_message]
@@ -0,0 +1,174 @@
+import bisect
+import json
+import threading
+import time
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+BYTES_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        if value is None:
+            return
+        with self._lock:
+            self._counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._sum += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            total = 0
+            for bound, count in zip(self.buckets, self._counts):
+                total += count
+                lines.append(f'{self.name}_bucket{{le="{bound}"}} {total}')
+            total += self._counts[-1]
+            lines.append(f'{self.name}_bucket{{le="+Inf"}} {total}')
+            lines.append(f"{self.name}_sum {self._sum}")
+            lines.append(f"{self.name}_count {total}")
+        return lines
+
+
+class Gauge:
+    """Value read from a callback at scrape time, e.g. a cache's hit counter."""
+
+    def __init__(self, name, help_text, read, kind="gauge"):
+        self.name = name
+        self.help = help_text
+        self.read = read
+        self.kind = kind
+
+    def render(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", f"{self.name} {self.read()}"]
+
+
+class ChatMetrics:
+    """Per-phase timings of chat requests, exported in the Prometheus text format.
+
+    With trace_path set, every finished request is also appended to that file as
+    one JSON line for offline profiling.
+    """
+
+    def __init__(self, trace_path=None, prefix="amharic_chat"):
+        self.prefix = prefix
+        self.trace_path = trace_path
+        self._trace_lock = threading.Lock()
+        self._metrics = []
+        p = prefix
+        self.requests = self.counter(f"{p}_requests_total", "Finished generation requests by source and finish reason")
+        self.completion_tokens = self.counter(f"{p}_completion_tokens_total", "Generated tokens")
+        self.queue_wait = self.histogram(f"{p}_queue_wait_seconds", "Time from submission to prefill start", SECONDS_BUCKETS)
+        self.prompt_tokens = self.histogram(f"{p}_prompt_tokens", "Prompt tokens per request", TOKEN_BUCKETS)
+        self.prefill = self.histogram(f"{p}_prefill_seconds", "Prefill forward pass time", SECONDS_BUCKETS)
+        self.ttft = self.histogram(f"{p}_time_to_first_token_seconds", "Submission to first generated token", SECONDS_BUCKETS)
+        self.first_chunk = self.histogram(
+            f"{p}_time_to_first_chunk_seconds", "Handler start to first text streamed to the client", SECONDS_BUCKETS
+        )
+        self.decode_rate = self.histogram(f"{p}_decode_tokens_per_second", "Decode speed per request", RATE_BUCKETS)
+        self.tts_latency = self.histogram(f"{p}_tts_seconds", "Time to produce one sentence of audio", SECONDS_BUCKETS)
+        self.tts_bytes = self.histogram(f"{p}_tts_audio_bytes", "Size of one sentence of audio", BYTES_BUCKETS)
+
+    def counter(self, name, help_text):
+        metric = Counter(name, help_text)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, buckets):
+        metric = Histogram(name, help_text, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name, help_text, read, kind="gauge"):
+        metric = Gauge(f"{self.prefix}_{name}", help_text, read, kind)
+        self._metrics.append(metric)
+        return metric
+
+    def observe_generation(self, streamer, source, first_chunk_s=None, **trace):
+        """Records a finished request from the timings its GenerationStreamer collected."""
+        times = streamer.token_times
+        queue_wait = streamer.started_at - streamer.submitted_at if streamer.started_at else None
+        ttft = times[0] - streamer.submitted_at if times else None
+        decode_rate = (len(times) - 1) / (times[-1] - times[0]) if len(times) > 1 and times[-1] > times[0] else None
+
+        self.requests.inc(source=source, finish_reason=streamer.finish_reason or "unknown")
+        self.completion_tokens.inc(streamer.completion_tokens)
+        self.queue_wait.observe(queue_wait)
+        self.prompt_tokens.observe(streamer.prompt_tokens)
+        self.prefill.observe(streamer.prefill_s)
+        self.ttft.observe(ttft)
+        self.first_chunk.observe(first_chunk_s)
+        self.decode_rate.observe(decode_rate)
+
+        if self.trace_path:
+            self.trace({
+                "source": source,
+                "finish_reason": streamer.finish_reason,
+                "prompt_tokens": streamer.prompt_tokens,
+                "completion_tokens": streamer.completion_tokens,
+                "queue_wait_s": queue_wait,
+                "prefill_s": streamer.prefill_s,
+                "ttft_s": ttft,
+                "first_chunk_s": first_chunk_s,
+                "decode_tokens_per_s": decode_rate,
+                **trace,
+            })
+
+    def observe_tts(self, seconds, size):
+        self.tts_latency.observe(seconds)
+        self.tts_bytes.observe(size)
+
+    def trace(self, record):
+        line = json.dumps({"time": time.time(), **record}, ensure_ascii=False)
+        with self._trace_lock:
+            with open(self.trace_path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def add_metrics_route(app, metrics):
+    from fastapi.responses import PlainTextResponse
+
+    @app.get("/metrics")
+    def scrape():
+        return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
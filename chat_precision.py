@@ -0,0 +1,22 @@
+import torch
+from transformers import AutoModelForCausalLM
+
+PRECISIONS = ("fp32", "bf16", "int8")
+
+
+def load_model(model_id, precision="fp32"):
+    """Loads the chat model in fp32, bf16 or with int8 dynamically quantized linear layers."""
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision '{precision}', expected one of {', '.join(PRECISIONS)}")
+
+    if precision == "int8":
+        # Dynamic quantization only runs on CPU, so the weights stay there
+        model = AutoModelForCausalLM.from_pretrained(model_id, torch_dtype=torch.float32, low_cpu_mem_usage=True)
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    else:
+        model = AutoModelForCausalLM.from_pretrained(
+            model_id,
+            torch_dtype=torch.bfloat16 if precision == "bf16" else torch.float32,
+            device_map="auto"
+        )
+    return model.eval()
@@ -0,0 +1,70 @@
+import threading
+from collections import OrderedDict
+
+
+def _cache_bytes(legacy):
+    return sum(t.numel() * t.element_size() for layer in legacy for t in layer)
+
+
+class PrefixCache:
+    """Per-session KV caches keyed by the token prefix they already cover.
+
+    Each session keeps the cache of its last finished turn. A new prompt reuses the
+    longest common token prefix with it, so only the new tail needs a prefill. When
+    history truncation changes the start of the prompt the common prefix shrinks
+    and the engine simply prefills more. Entries are evicted least recently used
+    first once either the session count or the total tensor size is exceeded.
+    """
+
+    def __init__(self, max_sessions=64, max_bytes=512 * 1024 * 1024):
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.reused_tokens = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(self, session_id, token_ids):
+        """Returns (legacy_cache, n) covering token_ids[:n], or (None, 0)."""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                self.misses += 1
+                return None, 0
+            self._entries.move_to_end(session_id)
+            cached_ids, legacy, _ = entry
+
+            # Keep at least one prompt token to prefill so there are logits to sample from
+            limit = min(len(cached_ids), len(token_ids) - 1)
+            n = 0
+            while n < limit and cached_ids[n] == token_ids[n]:
+                n += 1
+            if n == 0:
+                self.misses += 1
+                return None, 0
+            self.hits += 1
+            self.reused_tokens += n
+            return tuple((k[:, :, :n], v[:, :, :n]) for k, v in legacy), n
+
+    def store(self, session_id, token_ids, legacy):
+        """Remembers the cache for token_ids, which must match its sequence length."""
+        size = _cache_bytes(legacy)
+        with self._lock:
+            self._drop(session_id)
+            if size > self.max_bytes:
+                return
+            self._entries[session_id] = (list(token_ids), legacy, size)
+            self.total_bytes += size
+            while self._entries and (len(self._entries) > self.max_sessions or self.total_bytes > self.max_bytes):
+                self._drop(next(iter(self._entries)))
+
+    def drop(self, session_id):
+        with self._lock:
+            self._drop(session_id)
+
+    def _drop(self, session_id):
+        entry = self._entries.pop(session_id, None)
+        if entry is not None:
+            self.total_bytes -= entry[2]
@@ -0,0 +1,120 @@
+import threading
+import time
+
+WARMUP_MESSAGES = [{"role": "user", "content": "ሰላም"}]
+
+
+class ChatRuntime:
+    """Loads the tokenizer, model and generation engine in the background.
+
+    The UI can start serving straight away; handlers wait on wait_ready() and the
+    health routes report progress. A short warmup generation runs before the
+    runtime reports ready, so the first real request does not pay for it.
+    """
+
+    def __init__(self, model_id, precision="fp32", max_batch_size=8, prefix_cache=None, warmup=True, loader=None,
+                 drafter=None):
+        self.model_id = model_id
+        self.loader = loader
+        self.precision = precision
+        self.max_batch_size = max_batch_size
+        self.prefix_cache = prefix_cache
+        self.drafter = drafter
+        self.warmup = warmup
+        self.status = "starting"
+        self.error = None
+        self.timings = {}
+        self.tokenizer = None
+        self.model = None
+        self.engine = None
+        self.token_counter = None
+        self._ready = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._created = time.perf_counter()
+
+    @property
+    def ready(self):
+        return self.status == "ready"
+
+    def start(self):
+        """Starts loading; safe to call from any handler, only the first call does anything."""
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._load, name="model-loader", daemon=True)
+                self._thread.start()
+        return self
+
+    def wait_ready(self, timeout=None):
+        """Blocks until loading has finished; returns True if the model is usable."""
+        self._ready.wait(timeout)
+        return self.ready
+
+    def _load(self):
+        try:
+            self.status = "loading"
+            start = time.perf_counter()
+            from chat_engine import GenerationEngine
+            from chat_history import TokenCounter
+            loader = self.loader or _load_pretrained
+            self.timings["imports_s"] = round(time.perf_counter() - start, 3)
+
+            print(f"Loading model: {self.model_id} ({self.precision})")
+            start = time.perf_counter()
+            self.tokenizer, self.model = loader(self.model_id, self.precision)
+            self.token_counter = TokenCounter(self.tokenizer)
+            self.timings["weights_s"] = round(time.perf_counter() - start, 3)
+
+            self.engine = GenerationEngine(
+                self.model, self.tokenizer, max_batch_size=self.max_batch_size,
+                prefix_cache=self.prefix_cache, drafter=self.drafter
+            ).start()
+
+            if self.warmup:
+                self.status = "warming_up"
+                start = time.perf_counter()
+                streamer = self.engine.submit(WARMUP_MESSAGES, max_new_tokens=8, do_sample=False)
+                next(iter(streamer), None)
+                self.timings["first_token_s"] = round(time.perf_counter() - start, 3)
+                for _ in streamer:
+                    pass
+
+            self.timings["total_s"] = round(time.perf_counter() - self._created, 3)
+            self.status = "ready"
+            print("Model ready: " + ", ".join(f"{k}={v}" for k, v in self.timings.items()))
+        except Exception as e:
+            self.status = "failed"
+            self.error = str(e)
+            print(f"Model Loading Error: {e}")
+        finally:
+            self._ready.set()
+
+    def health(self):
+        return {
+            "status": self.status,
+            "ready": self.ready,
+            "model_id": self.model_id,
+            "precision": self.precision,
+            "timings": self.timings,
+            "error": self.error,
+        }
+
+
+def _load_pretrained(model_id, precision):
+    from transformers import AutoTokenizer
+
+    from chat_precision import load_model
+    return AutoTokenizer.from_pretrained(model_id), load_model(model_id, precision)
+
+
+def add_health_routes(app, runtime):
+    """/health always answers (liveness); /ready returns 503 until the model can serve."""
+    from fastapi.responses import JSONResponse
+
+    @app.get("/health")
+    def health():
+        return runtime.health()
+
+    @app.get("/ready")
+    def ready():
+        return JSONResponse(runtime.health(), status_code=200 if runtime.ready else 503)
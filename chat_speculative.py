@@ -0,0 +1,26 @@
+class PromptLookupDrafter:
+    """Drafts tokens by finding the latest n-gram earlier in the context and copying what followed.
+
+    Amharic replies often repeat names, places and refrains from the conversation, so
+    the continuation of an earlier occurrence is a cheap, model-free guess that the
+    engine then verifies in one forward pass. Any object with the same propose()
+    method, such as a small draft model, can be plugged in instead.
+    """
+
+    def __init__(self, num_draft_tokens=8, max_ngram=3, min_ngram=1):
+        self.num_draft_tokens = num_draft_tokens
+        self.max_ngram = max_ngram
+        self.min_ngram = min_ngram
+
+    def propose(self, token_ids, limit=None):
+        """Returns up to num_draft_tokens (and at most limit) guessed next tokens, or []."""
+        k = self.num_draft_tokens if limit is None else min(self.num_draft_tokens, limit)
+        if k <= 0:
+            return []
+        for n in range(min(self.max_ngram, len(token_ids) - 1), self.min_ngram - 1, -1):
+            tail = token_ids[-n:]
+            # Most recent earlier occurrence first; it is likeliest to continue the same way
+            for start in range(len(token_ids) - n - 1, -1, -1):
+                if token_ids[start] == tail[0] and token_ids[start:start + n] == tail:
+                    return token_ids[start + n:start + n + k]
+        return []
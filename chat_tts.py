@@ -0,0 +1,173 @@
+import os
+import re
+import threading
+import time
+import wave
+from collections import deque
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+# Amharic full stop, Amharic question mark and their Latin counterparts
+SENTENCE_END = re.compile(r"[^።፧!?]*[።፧!?]+")
+
+
+class SentenceSplitter:
+    """Collects streamed text and releases it one finished sentence at a time."""
+
+    def __init__(self):
+        self._buffer = ""
+
+    def feed(self, text):
+        self._buffer += text
+        sentences = []
+        end = 0
+        for match in SENTENCE_END.finditer(self._buffer):
+            end = match.end()
+            if match.group().strip():
+                sentences.append(match.group().strip())
+        self._buffer = self._buffer[end:]
+        return sentences
+
+    def flush(self):
+        rest, self._buffer = self._buffer.strip(), ""
+        return [rest] if rest else []
+
+
+class GTTSBackend:
+    """Google Text-to-Speech, the default online voice."""
+
+    suffix = ".mp3"
+
+    def __init__(self, lang="am"):
+        self.lang = lang
+        self.voice = "gtts"
+
+    def synthesize(self, text, path):
+        from gtts import gTTS
+        gTTS(text=text, lang=self.lang).save(path)
+
+
+class SilentBackend:
+    """Offline stand-in for tests and benchmarks: writes silence sized to the text."""
+
+    suffix = ".wav"
+
+    def __init__(self, delay=0.0, seconds_per_char=0.05, sample_rate=16000):
+        self.lang = "am"
+        self.voice = "silent"
+        self.delay = delay
+        self.seconds_per_char = seconds_per_char
+        self.sample_rate = sample_rate
+
+    def synthesize(self, text, path):
+        if self.delay:
+            time.sleep(self.delay)
+        frames = int(len(text) * self.seconds_per_char * self.sample_rate)
+        with wave.open(path, "wb") as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(self.sample_rate)
+            f.writeframes(b"\x00\x00" * frames)
+
+
+def make_backend(name):
+    if name == "silent":
+        return SilentBackend()
+    return GTTSBackend()
+
+
+class SpeechPipeline:
+    """Worker pool that turns reply sentences into audio files while decoding continues."""
+
+    def __init__(self, backend, cache, workers=2, metrics=None):
+        self.backend = backend
+        self.cache = cache
+        self.metrics = metrics
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tts")
+
+    def start_reply(self):
+        return SpeechStream(self)
+
+    def submit(self, text):
+        return self._executor.submit(self._synthesize, text)
+
+    def _synthesize(self, text):
+        start = time.perf_counter()
+        try:
+            path = self.cache.get_or_create(text, self.backend)
+        except Exception as e:
+            print(f"TTS Error: {e}")
+            return None, time.perf_counter() - start, 0
+        seconds, size = time.perf_counter() - start, os.path.getsize(path)
+        if self.metrics:
+            self.metrics.observe_tts(seconds, size)
+        return path, seconds, size
+
+
+class SpeechStream:
+    """Audio chunks of one reply, handed back in sentence order.
+
+    cancel() may come from another handler thread while the reply's own thread is
+    feeding or draining, so the queue of pending sentences is guarded by a lock.
+    """
+
+    def __init__(self, pipeline):
+        self._pipeline = pipeline
+        self._splitter = SentenceSplitter()
+        self._futures = deque()
+        self._lock = threading.Lock()
+        self.cancelled = False
+        self.sentences = 0
+        self.tts_seconds = 0.0
+        self.audio_bytes = 0
+
+    def feed(self, text):
+        with self._lock:
+            if not self.cancelled:
+                for sentence in self._splitter.feed(text):
+                    self._futures.append(self._pipeline.submit(sentence))
+
+    def finish(self):
+        with self._lock:
+            if not self.cancelled:
+                for sentence in self._splitter.flush():
+                    self._futures.append(self._pipeline.submit(sentence))
+
+    def cancel(self):
+        """Drops the sentences still queued; one already being voiced finishes into the cache."""
+        with self._lock:
+            self.cancelled = True
+            self._splitter.flush()
+            while self._futures:
+                self._futures.popleft().cancel()
+
+    def ready(self):
+        """Yields audio paths that are done, stopping at the first one still pending."""
+        while True:
+            with self._lock:
+                if not self._futures or not self._futures[0].done():
+                    return
+                future = self._futures.popleft()
+            path = self._collect(future)
+            if path:
+                yield path
+
+    def drain(self):
+        """Waits for and yields every remaining audio path in order."""
+        while True:
+            with self._lock:
+                if not self._futures:
+                    return
+                future = self._futures.popleft()
+            path = self._collect(future)
+            if path:
+                yield path
+
+    def _collect(self, future):
+        try:
+            path, seconds, size = future.result()
+        except CancelledError:
+            return None  # Cancelled by another thread while this one was waiting
+        self.sentences += 1
+        self.tts_seconds += seconds
+        self.audio_bytes += size
+        return path
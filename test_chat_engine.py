@@ -0,0 +1,125 @@
+"""The engine's batched, prefix-cached and speculative paths must decode exactly what
+model.generate() does. Greedy decoding on the tiny random model from bench_chat.py,
+so this runs offline:
+
+    python -m pytest -q test_chat_engine.py
+"""
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("transformers")
+
+from bench_chat import tiny_loader
+from chat_engine import GenerationEngine
+from chat_prefix_cache import PrefixCache
+from chat_speculative import PromptLookupDrafter
+
+MAX_NEW_TOKENS = 24
+REPETITION_PENALTY = 1.1
+PROMPTS = ["ሰላም", "ስለ ኢትዮጵያ የዘመን አቆጣጠር ንገረኝ?", "ቢትኮይን ምንድን ነው?"]
+
+
+@pytest.fixture(scope="module")
+def tiny():
+    tokenizer, model = tiny_loader(64, 2)(None, "fp32")
+    # At the default init scale the model repeats one token whatever its context, which
+    # would hide wrong positions or masks; wider weights make every token depend on them
+    generator = torch.Generator().manual_seed(0)
+    with torch.no_grad():
+        for param in model.parameters():
+            if param.dim() == 2:
+                param.normal_(0, 0.3, generator=generator)
+    return tokenizer, model
+
+
+def make_engine(tiny, **kwargs):
+    """Engine whose generated token ids are recorded per streamer."""
+    tokenizer, model = tiny
+    engine = GenerationEngine(model, tokenizer, **kwargs)
+    engine.tokens = {}
+    accept = engine._accept
+
+    def recording_accept(seq, token):
+        engine.tokens.setdefault(seq.request.streamer, []).append(token)
+        return accept(seq, token)
+    engine._accept = recording_accept
+    return engine
+
+
+def reference(tiny, messages):
+    """Token ids model.generate() produces for the same chat, greedily."""
+    tokenizer, model = tiny
+    text = tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+    input_ids = torch.tensor([tokenizer(text, add_special_tokens=False)["input_ids"]])
+    with torch.inference_mode():
+        output = model.generate(
+            input_ids, attention_mask=torch.ones_like(input_ids), max_new_tokens=MAX_NEW_TOKENS,
+            do_sample=False, repetition_penalty=REPETITION_PENALTY, pad_token_id=tokenizer.eos_token_id,
+        )
+    return output[0, input_ids.shape[1]:].tolist()
+
+
+def run(engine, messages, session_id=None):
+    streamer = engine.submit(messages, MAX_NEW_TOKENS, REPETITION_PENALTY, do_sample=False, session_id=session_id)
+    reply = "".join(streamer)
+    return engine.tokens[streamer], reply
+
+
+def test_batched_requests_match_generate(tiny):
+    engine = make_engine(tiny, max_batch_size=len(PROMPTS))
+    chats = [[{"role": "user", "content": prompt}] for prompt in PROMPTS]
+    # Queued before the engine starts, so all of them share one left-padded batch
+    streamers = [engine.submit(chat, MAX_NEW_TOKENS, REPETITION_PENALTY, do_sample=False) for chat in chats]
+    engine.start()
+    for streamer in streamers:
+        "".join(streamer)
+    for chat, streamer in zip(chats, streamers):
+        assert engine.tokens[streamer] == reference(tiny, chat)
+
+
+def test_second_turn_from_prefix_cache_matches_generate(tiny):
+    prefix_cache = PrefixCache()
+    engine = make_engine(tiny, prefix_cache=prefix_cache).start()
+    history = [{"role": "user", "content": PROMPTS[1]}]
+    _, reply = run(engine, history, session_id="s")
+    history += [{"role": "assistant", "content": reply.strip()}, {"role": "user", "content": PROMPTS[2]}]
+    tokens, _ = run(engine, history, session_id="s")
+    assert prefix_cache.hits == 1 and prefix_cache.reused_tokens > 0
+    assert tokens == reference(tiny, history)
+
+
+def test_prompt_lookup_drafter_matches_generate(tiny):
+    engine = make_engine(tiny, max_batch_size=1, drafter=PromptLookupDrafter(num_draft_tokens=4)).start()
+    # A repetitive prompt gives the drafter n-grams to copy from
+    chat = [{"role": "user", "content": " ".join([PROMPTS[1]] * 3)}]
+    tokens, _ = run(engine, chat)
+    assert engine.drafted_tokens > 0
+    assert tokens == reference(tiny, chat)
+
+
+class ScriptedDrafter:
+    """Drafts the known greedy continuation with every third token wrong, so verification
+    both accepts and rejects drafted tokens and the cache is cropped after each."""
+
+    def __init__(self, prompt_length, expected, vocab_size):
+        self.prompt_length = prompt_length
+        self.expected = expected
+        self.vocab_size = vocab_size
+
+    def propose(self, token_ids, limit=None):
+        done = len(token_ids) - self.prompt_length
+        draft = self.expected[done:done + min(4, limit or 4)]
+        return [(token + 1) % self.vocab_size if (done + i) % 3 == 2 else token for i, token in enumerate(draft)]
+
+
+def test_partly_accepted_drafts_match_generate(tiny):
+    tokenizer, model = tiny
+    chat = [{"role": "user", "content": PROMPTS[2]}]
+    expected = reference(tiny, chat)
+    prompt = tokenizer.apply_chat_template(chat, tokenize=False, add_generation_prompt=True)
+    prompt_length = len(tokenizer(prompt, add_special_tokens=False)["input_ids"])
+    drafter = ScriptedDrafter(prompt_length, expected, model.config.vocab_size)
+    engine = make_engine(tiny, max_batch_size=1, drafter=drafter).start()
+    tokens, _ = run(engine, chat)
+    assert 0 < engine.accepted_tokens < engine.drafted_tokens
+    assert tokens == expected